@@ -1,10 +1,12 @@
 import serial
-import time, sys, traceback
+import time, sys, threading, traceback
+from serial_latency import set_low_latency
 # sudo chmod a+rw /dev/ttyUSB1
 
 '''
 It is not reliable to use readInfo of the ARoF transmitter and receiver
-Please reinitialize the object each time after set bias voltage
+set_bias_vol drains the port buffers before returning, so the same object
+can be reused across set/read calls (call flush_state() if in doubt)
 '''
 
 '''
@@ -26,15 +28,137 @@ SETXB:YYY {CR,LF} X = Current address, default 1; Y = Bias voltage in V;
 Sets bias voltage. Max bias voltage indicated on test report.
 '''
 
+def _read_until_deadline(port, timeout, keyword, quiet=0.05):
+    """
+    Read a whole READ0 reply, up to its closing blank line, instead of
+    sleeping and reading a fixed byte count. Once the line containing
+    `keyword` is terminated, `quiet` seconds without a byte also end the
+    frame, so no later line of it is left behind for the next request.
+    Only reads what is already waiting, so it never blocks past `timeout`.
+    """
+    buf = bytearray()
+    end = time.monotonic() + timeout
+    last_rx = time.monotonic()
+    have_key = False
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        n = port.in_waiting
+        if not n:
+            if have_key and now - last_rx >= quiet:
+                break
+            time.sleep(0.0005)
+            continue
+        buf += port.read(n)
+        last_rx = now
+        if buf.endswith(b"\r\n\r\n"):
+            break
+        if not have_key:
+            idx = buf.find(keyword)
+            have_key = idx != -1 and buf.find(b"\r\n", idx) != -1
+    return bytes(buf)
+
+# READ0/READ0B/READ0C reply markers -> key in the background reader's cache
+_REPLY_KEYS = (("Output", "output_power"), ("Input", "input_power"),
+               ("Bias", "bias"), ("Current", "current"))
+
+def _parse_reply_line(line):
+    for marker, key in _REPLY_KEYS:
+        if marker in line:
+            try:
+                return key, float(line.split(":")[-1].split()[0])
+            except (ValueError, IndexError):
+                return None
+    return None
+
+class _ReplyReader():
+    """
+    Daemon thread that owns the read side of the port: it splits incoming
+    bytes on CR/LF, parses known reply lines and keeps the latest value of
+    each with a timestamp, so callers get cached values without blocking.
+    """
+    def __init__(self, port):
+        self.port = port
+        self._cond = threading.Condition()
+        self._latest = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        buf = bytearray()
+        while not self._stop.is_set():
+            try:
+                chunk = self.port.read(self.port.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError):
+                break # port closed under us
+            if not chunk:
+                continue
+            buf += chunk
+            *lines, rest = buf.split(b"\r\n")
+            buf = bytearray(rest)
+            for raw in lines:
+                parsed = _parse_reply_line(raw.decode(errors="ignore"))
+                if parsed is None:
+                    continue
+                key, value = parsed
+                with self._cond:
+                    self._latest[key] = (value, time.monotonic())
+                    self._cond.notify_all()
+
+    def get(self, key, request, max_age=None, timeout=1.0):
+        """
+        Return the cached value for `key`; if missing or older than `max_age`
+        seconds, send `request` and wait up to `timeout` for a fresh reply.
+        """
+        with self._cond:
+            entry = self._latest.get(key)
+            if entry is not None and (max_age is None or time.monotonic() - entry[1] <= max_age):
+                return entry[0]
+            t_req = time.monotonic()
+            self.port.write(request)
+            fresh = lambda: key in self._latest and self._latest[key][1] >= t_req
+            if not self._cond.wait_for(fresh, timeout):
+                raise Exception(f"ARoF: no {key} reply within {timeout} s")
+            return self._latest[key][0]
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2 * (self.port.timeout or 1))
+
 class ARoF_transceiver():
     def __init__(self,port_num):
         self.port_num = port_num
         self.bias_vol_sleep_time = 5 # should not below this number by empirical
-        self.infoReadingTime = 1
+        self.infoReadingTime = 1 # upper bound on the READ0 reply
+        self._output_line_idx = None # position of the "Output" line in READ0
+        self._reader = None
         self.arof = serial.Serial(self.port_num, baudrate=9600, timeout=1.0)
+        set_low_latency(self.arof)
 
     def __del__(self):
+        self.stop_reader()
         self.arof.close()
+
+    # background reader: while it runs, use the latest_* getters instead of
+    # the blocking read methods, which would race it for the incoming bytes
+    def start_reader(self):
+        if self._reader is None:
+            self._reader = _ReplyReader(self.arof)
+
+    def stop_reader(self):
+        if getattr(self, "_reader", None) is not None:
+            self._reader.stop()
+            self._reader = None
+
+    def latest_bias(self, max_age=None):
+        self.start_reader()
+        return self._reader.get("bias", b"READ0B\r\n", max_age)
+
+    def latest_output_power(self, max_age=None):
+        self.start_reader()
+        return self._reader.get("output_power", b"READ0\r\n", max_age, timeout=self.infoReadingTime)
     
     def setAddr(self):
         self.arof.write(str.encode("SETADD 0\r\n"))
@@ -46,10 +170,10 @@ class ARoF_transceiver():
         # self.setAddr()
         # time.sleep(self.infoReadingTime)
         request = "READ0\r\n"
+        self.arof.reset_input_buffer() # drop anything left from an earlier reply
         self.arof.write(request.encode())
-        time.sleep(self.infoReadingTime)
-        rcv = self.arof.read(139).decode() # 138 is magic number
-        return rcv
+        rcv = _read_until_deadline(self.arof, self.infoReadingTime, b"Output")
+        return rcv.decode(errors="ignore")
         
     def readOutputPower(self):
         print("Warning: transmitter power reading is not correct")
@@ -58,8 +182,14 @@ class ARoF_transceiver():
         # input_power = input_power_line.split(":")[-1][:-4]
         # return float(input_power)
         splitedLines = [x for x in info.split("\r\n") if x]
-        for line in splitedLines:
+        idx = self._output_line_idx
+        if idx is not None and idx < len(splitedLines) and "Output" in splitedLines[idx]:
+            candidates = [(idx, splitedLines[idx])]
+        else:
+            candidates = enumerate(splitedLines)
+        for i, line in candidates:
             if "Output" in line:
+                self._output_line_idx = i
                 try:
                     val_str = line.split(":")[-1].strip()     # "-2.97 dBm"
                     return float(val_str.split()[0])          # -2.97
@@ -68,19 +198,44 @@ class ARoF_transceiver():
         # print(info)
         raise Exception("ARoF receiver Input power not found")
 
+    def _readline_fast(self, term=b"\r\n", deadline=0.3):
+        """
+        Return the first non-empty reply line (without `term`) as soon as its
+        terminator arrives, polling in_waiting rather than blocking in readline.
+        Between polls it sleeps 0.5 ms (about half a byte time at 9600 baud),
+        so the wait does not keep a core busy. Returns b"" if no complete line
+        arrives within `deadline`: a truncated one ("Bias is: -0.") would
+        parse as a wrong reading.
+        """
+        data = bytearray()
+        end = time.monotonic() + deadline
+        while time.monotonic() < end:
+            n = self.arof.in_waiting
+            if not n:
+                time.sleep(0.0005)
+                continue
+            data += self.arof.read(n)
+            while data.startswith(term):
+                del data[:len(term)]
+            i = data.find(term)
+            if i != -1:
+                return bytes(data[:i])
+        return b""
+
     def read_bias_vol(self):
         """
         READ0B — return the bias voltage (V) as a float.
         Example response: 'Bias is: -0.1'
         """
-        self.arof.write(b"\r\nREAD0B\r\n") # SET0B:-1.10
+        self.arof.reset_input_buffer() # a stale line would be parsed as the reading
+        self.arof.write(b"READ0B\r\n") # SET0B:-1.10
         # rcv = self.arof.readline()
         # if len(rcv) <=0:
         #     print("unsuccess")
         # else:
         #     print(rcv.decode())
         #     return True # success
-        rcv = self.arof.readline().decode(errors="ignore").strip()
+        rcv = self._readline_fast().decode(errors="ignore").strip()
         try:
             return float(rcv.split(":")[-1].strip())
         except Exception:
@@ -91,14 +246,15 @@ class ARoF_transceiver():
         READ0C — return the bias current (mA) as an integer.
         Example response: 'Current is: 099'
         """
-        self.arof.write(b"\r\nREAD0C\r\n") # SET0B:-1.10
+        self.arof.reset_input_buffer() # a stale line would be parsed as the reading
+        self.arof.write(b"READ0C\r\n") # SET0B:-1.10
         # rcv = self.arof.readline()
         # if len(rcv) <=0:
         #     print("unsuccess")
         # else:
         #     print(rcv.decode())
         #     return True # success
-        rcv = self.arof.readline().decode(errors="ignore").strip()
+        rcv = self._readline_fast().decode(errors="ignore").strip()
         # print(rcv)
         try:
             return int(rcv.split(":")[-1].strip())
@@ -107,21 +263,50 @@ class ARoF_transceiver():
 
     # return true if set success
     # -2.5 <= bias <= +0.5
-    def set_bias_vol(self,bias):
+    def set_bias_vol(self,bias, *, tol=0.02, max_wait=None):
         """
         SET0B:<bias> — set bias voltage between -2.5 and 0.5 V.
         Example ack: 'Success Bias is: -0.1'
+        Polls READ0B every 50 ms and returns as soon as two consecutive
+        readings agree and sit within `tol` of the target; otherwise gives
+        up after `max_wait` seconds (default: bias_vol_sleep_time).
+        The port buffers are drained before returning, so the object can be
+        reused without reopening the port.
         """
         assert bias >=-2.5 and bias <= 0.5
-        self.arof.write(f"\r\nSET0B:{bias}\r\n".encode())
+        self.arof.write(f"SET0B:{bias}\r\n".encode())
         # rcv = self.arof.readline()
         rcv = self.arof.readline().decode(errors="ignore").strip()
-        time.sleep(self.bias_vol_sleep_time)
+        if max_wait is None:
+            max_wait = self.bias_vol_sleep_time
+        t0 = time.monotonic()
+        last = None
+        while time.monotonic() - t0 < max_wait:
+            try:
+                v = self.read_bias_vol()
+            except Exception:
+                v = None
+            if v is not None and last is not None and abs(v - bias) < tol and abs(v - last) < 0.005:
+                self._drain()
+                return v
+            last = v
+            time.sleep(0.05)
+        self._drain()
         try:
             return float(rcv.split(":")[-1].strip())
         except Exception:
             return float(bias)
 
+    def _drain(self):
+        # drop late acks so the next request does not read a stale line
+        self.arof.reset_output_buffer()
+        time.sleep(0.02)
+        self.arof.reset_input_buffer()
+
+    def flush_state(self):
+        self.arof.reset_input_buffer()
+        self.arof.reset_output_buffer()
+
     # set bias current like 099, 050, etc...
     def set_bias_cur(self,bias):
         """
@@ -130,7 +315,7 @@ class ARoF_transceiver():
         Accepts either a 3-digit string ('099') or an int (99).
         """
         bias_str = str(bias).zfill(3) if isinstance(bias, str) else f"{int(bias):03d}"
-        self.arof.write(f"\r\nSET0C:{bias_str}\r\n".encode())
+        self.arof.write(f"SET0C:{bias_str}\r\n".encode())
         # rcv = self.arof.readline()
         rcv = self.arof.readline().decode(errors="ignore").strip()
         # rcv = self.arof.read(50)
@@ -142,12 +327,30 @@ class ARoF_transceiver():
 class ARoF_reciever():
     def __init__(self,port_num):
         self.port_num = port_num
-        self.infoReadingTime = 1
+        self.infoReadingTime = 1 # upper bound on the READ0 reply
+        self._input_line_idx = None # position of the "Input" line in READ0
+        self._reader = None
         self.arof = serial.Serial(self.port_num, baudrate=9600, timeout=3.0)
+        set_low_latency(self.arof)
 
     def __del__(self):
+        self.stop_reader()
         self.arof.close()
 
+    # see ARoF_transceiver.start_reader
+    def start_reader(self):
+        if self._reader is None:
+            self._reader = _ReplyReader(self.arof)
+
+    def stop_reader(self):
+        if getattr(self, "_reader", None) is not None:
+            self._reader.stop()
+            self._reader = None
+
+    def latest_input_power(self, max_age=None):
+        self.start_reader()
+        return self._reader.get("input_power", b"READ0\r\n", max_age, timeout=self.infoReadingTime)
+
     def setAddr(self):
         self.arof.write(str.encode("SETADD 0\r\n"))
         # rcv = self.arof.readline()
@@ -159,17 +362,23 @@ class ARoF_reciever():
         # self.setAddr()
         # time.sleep(self.infoReadingTime)
         request = "READ0\r\n"
+        self.arof.reset_input_buffer() # drop anything left from an earlier reply
         self.arof.write(request.encode())
-        time.sleep(self.infoReadingTime)
-        rcv = self.arof.read(120).decode()  # 120 is magic number
-        return rcv
+        rcv = _read_until_deadline(self.arof, self.infoReadingTime, b"Input")
+        return rcv.decode(errors="ignore")
         
     def readInputPower(self):
         info = self.readInfo()
         # input_power_line = info.split("\r\n")[-2]
         splitedLines = info.split("\r\n")
-        for line in splitedLines:
+        idx = self._input_line_idx
+        if idx is not None and idx < len(splitedLines) and "Input" in splitedLines[idx]:
+            candidates = [(idx, splitedLines[idx])]
+        else:
+            candidates = enumerate(splitedLines)
+        for i, line in candidates:
             if "Input" in line:
+                self._input_line_idx = i
                 try:
                     input_power = line.split(":")[-1][:-4]
                     return float(input_power)
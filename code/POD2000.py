@@ -1,10 +1,49 @@
 # pod2000.py
 import time
 import math
+import array
+from functools import lru_cache
+import numpy as np
 import usb.core
 import usb.util
 import usb.backend.libusb1
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+@lru_cache(maxsize=64)
+def _encode_cmd(cmd: str) -> bytes:
+    # hot commands (:READ:VALue?, *IDN?) are encoded once
+    return (cmd + "\n").encode("ascii")
+
+@njit(cache=True, fastmath=True)
+def _stokes_to_pol_kernel(S0, S1, S2, S3):
+    # straight-line code: the guards below are selects, not early returns
+    EPS = 1e-12
+    S0c = S0 if abs(S0) > EPS else EPS
+
+    # DOP (per manual Appendix A)
+    Snorm = math.sqrt(S1*S1 + S2*S2 + S3*S3)
+    # Undefined azimuth/ellipticity if no polarized component -> all zeros
+    pol = float(Snorm >= EPS)
+    dop = pol * Snorm / S0c
+
+    # Azimuth psi and ellipticity angle chi; the angles do not depend on
+    # |S|, so the Stokes vector needs no normalization first
+    psi_deg = math.degrees(0.5 * math.atan2(S2, S1))
+    chi_deg = math.degrees(0.5 * math.atan2(S3, math.sqrt(S1*S1 + S2*S2)))
+
+    # wrap psi into (-90, 90]
+    psi_deg += 180.0 * (psi_deg <= -90.0) - 180.0 * (psi_deg > 90.0)
+    return dop, pol * psi_deg, pol * chi_deg
+
+_READ_VALUE = _encode_cmd(":READ:VALue?")
+
 class POD2000:
     def __init__(
         self,
@@ -31,6 +70,13 @@ class POD2000:
         self.intf = None
         self.ep_out = None  # 0x01
         self.ep_in  = None  # 0x81
+        self._xfer = None   # (write, read) bound at open() for read_raw5
+
+        # reusable IN buffer so each SCPI read does not allocate a fresh array
+        self._rxbuf = array.array("B", bytes(self.pkt_size))
+
+        # encoded :CONF payloads keyed on (wavelength, gain, transfer, unit)
+        self._cfg_cache: dict[tuple, bytes] = {}
 
     # --- open / close ---
     def open(self):
@@ -51,6 +97,7 @@ class POD2000:
         self.ep_in  = usb.util.find_descriptor(self.intf, bEndpointAddress=0x81)
         if self.ep_out is None or self.ep_in is None:
             raise RuntimeError("Bulk endpoints 0x01/0x81 not found")
+        self._xfer = (self.ep_out.write, self.ep_in.read)
 
     def close(self):
         try:
@@ -58,15 +105,16 @@ class POD2000:
                 usb.util.dispose_resources(self.dev)
         finally:
             self.dev = self.cfg = self.intf = self.ep_out = self.ep_in = None
+            self._xfer = None
 
     # --- SCPI helpers ---
     def scpi(self, cmd: str, expect_reply=True):
         if not (self.ep_out and self.ep_in):
             raise RuntimeError("Device not open")
-        self.ep_out.write((cmd + "\n").encode("ascii"), timeout=self.timeout)
+        self.ep_out.write(_encode_cmd(cmd), timeout=self.timeout)
         if expect_reply:
-            data = self.ep_in.read(self.pkt_size, timeout=self.timeout).tobytes()
-            return data.decode("ascii", errors="ignore").strip()
+            n = self.ep_in.read(self._rxbuf, timeout=self.timeout)
+            return self._rxbuf[:n].tobytes().decode("ascii", errors="ignore").strip()
         return None
 
     def idn(self) -> str:
@@ -96,10 +144,21 @@ class POD2000:
         if u not in {"UW","NW"}:
             raise ValueError("power_unit must be UW or NW")
 
-        self.scpi(f":CONF:TRANSfer {'MANual' if t=='MANUAL' else 'CONTinuous'}", expect_reply=False)
-        self.scpi(f":CONF:WAVElength {w:.4f}", expect_reply=False)
-        self.scpi(f":CONF:GAIN {'OPTImize' if g=='OPTIMIZE' else g}", expect_reply=False)
-        self.scpi(f":UNIT:POWer {u}", expect_reply=False)
+        if not (self.ep_out and self.ep_in):
+            raise RuntimeError("Device not open")
+
+        # all four commands go out in one bulk transfer (SCPI accepts \n-separated commands)
+        key = (w, g, t, u)
+        payload = self._cfg_cache.get(key)
+        if payload is None:
+            payload = "".join([
+                f":CONF:TRANSfer {'MANual' if t=='MANUAL' else 'CONTinuous'}\n",
+                f":CONF:WAVElength {w:.4f}\n",
+                f":CONF:GAIN {'OPTImize' if g=='OPTIMIZE' else g}\n",
+                f":UNIT:POWer {u}\n",
+            ]).encode("ascii")
+            self._cfg_cache[key] = payload
+        self.ep_out.write(payload, timeout=self.timeout)
         time.sleep(0.1)
 
     # --- reading ---
@@ -109,52 +168,66 @@ class POD2000:
             raise ValueError("Empty reply")
         # print(raw)
         s = raw.strip().strip('"').strip("'")
-        parts = [p.strip() for p in s.split(",")]
+        parts = s.split(",")
         if len(parts) != 5:
             raise ValueError(f"Expected 5 values, got {len(parts)}: {parts}")
         try:
-            v1, v2, v3, v4, v5 = (float(p) for p in parts)
+            # float() already ignores surrounding whitespace
+            return tuple(map(float, parts))
         except ValueError as e:
             raise ValueError(f"Non-numeric field in reply: {parts}") from e
-        return v1, v2, v3, v4, v5
 
     def read_raw5(self):
-        raw = self.scpi(":READ:VALue?")
-        return self._parse_read_value(raw)
+        # hot path: pre-encoded command, endpoint methods bound once at open()
+        if self._xfer is None:
+            raise RuntimeError("Device not open")
+        write, read = self._xfer
+        write(_READ_VALUE, self.timeout)
+        n = read(self._rxbuf, self.timeout)
+        return self._parse_read_value(self._rxbuf[:n].tobytes().decode("ascii", errors="ignore"))
+
+    @staticmethod
+    def _stokes_to_pol(S0, S1, S2, S3):
+        # native code when numba is installed; floats in, floats out
+        return _stokes_to_pol_kernel(float(S0), float(S1), float(S2), float(S3))
+
+    def read_all(self):
+        """Polarization and power from a single :READ:VALue? -> (dop, psi_deg, chi_deg, power)"""
+        S0, S1, S2, S3, power = self.read_raw5()
+        dop, psi_deg, chi_deg = self._stokes_to_pol(S0, S1, S2, S3)
+        return dop, psi_deg, chi_deg, float(power)
 
     def read_pol(self):
-        S0, S1, S2, S3, _power = self.read_raw5()
+        dop, psi_deg, chi_deg, _power = self.read_all()
+        return dop, psi_deg, chi_deg
+
+    def read_pol_bulk(self, n: int):
+        """
+        Burst-read n samples and convert them together.
+        Returns (dop, psi_deg, chi_deg) as float64 arrays of length n.
+        """
+        arr = np.empty((int(n), 5), dtype=np.float64)
+        for i in range(arr.shape[0]):
+            arr[i] = self.read_raw5()
+        S0, S1, S2, S3 = arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3]
 
         EPS = 1e-12
-        S0c = S0 if abs(S0) > EPS else EPS
-
-        # Sphere-normalized Stokes and DOP (per manual Appendix A)
-        Snorm = (S1*S1 + S2*S2 + S3*S3) ** 0.5
-        if Snorm < EPS:
-            # Undefined azimuth/ellipticity if no polarized component
-            return 0.0, 0.0, 0.0
-
-        s1, s2, s3 = S1 / Snorm, S2 / Snorm, S3 / Snorm
-        dop = Snorm / S0c
-
-        # Azimuth psi and ellipticity angle chi (in radians)
-        psi_rad = 0.5 * math.atan2(s2, s1)   # uses normalized s1,s2
-        # s3c = -1.0 if s3 < -1.0 else (1.0 if s3 > 1.0 else s3)
-        # chi_rad = 0.5 * math.asin(s3c)       # uses normalized s3
-        chi_rad = 0.5 * math.atan2(s3, (s1*s1 + s2*s2) ** 0.5)
-
-        # Convert to degrees; wrap psi into (-90, 90]
-        psi_deg = math.degrees(psi_rad)
-        if psi_deg <= -90.0:
-            psi_deg += 180.0
-        if psi_deg > 90.0:
-            psi_deg -= 180.0
-
-        chi_deg = math.degrees(chi_rad)
+        Snorm = np.sqrt(S1*S1 + S2*S2 + S3*S3)
+        dop = Snorm / np.where(np.abs(S0) > EPS, S0, EPS)
+
+        # angles do not depend on |S|, so no normalization is needed here
+        psi_deg = np.degrees(0.5 * np.arctan2(S2, S1))
+        psi_deg = np.where(psi_deg <= -90.0, psi_deg + 180.0, psi_deg)
+        psi_deg = np.where(psi_deg > 90.0, psi_deg - 180.0, psi_deg)
+        chi_deg = np.degrees(0.5 * np.arctan2(S3, np.hypot(S1, S2)))
+
+        # undefined azimuth/ellipticity if no polarized component (same as read_pol)
+        unpolarized = Snorm < EPS
+        dop[unpolarized] = 0.0
+        psi_deg[unpolarized] = 0.0
+        chi_deg[unpolarized] = 0.0
         return dop, psi_deg, chi_deg
 
     def read_power(self):
         _S0, _S1, _S2, _S3, power = self.read_raw5()
-        power_f = float(power)
-        return power_f
-
+        return float(power)
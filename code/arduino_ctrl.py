@@ -1,6 +1,47 @@
 from Arduino import Arduino
 import time
+from functools import lru_cache
 from typing import Optional, Dict, List
+from serial_latency import set_low_latency
+
+_LEVELS = ("LOW", "HIGH")  # indexed by bit value
+
+def _cmd_frame(cmd: str, *args) -> bytes:
+    """Encode one command in the Arduino sketch's @cmd%arg%...$! format."""
+    return ("@" + "%".join([cmd, *map(str, args)]) + "$!").encode()
+
+@lru_cache(maxsize=None)  # a handful of (pin, mode) pairs: encoded once each
+def _pin_mode_frame(pin: int, mode: str) -> bytes:
+    # the sketch encodes INPUT as a negative pin number
+    return _cmd_frame("pm", -pin if mode == "INPUT" else pin)
+
+@lru_cache(maxsize=None)
+def _digital_write_frame(pin: int, level: str) -> bytes:
+    # the sketch encodes LOW as a negative pin number
+    return _cmd_frame("dw", -pin if level == "LOW" else pin)
+
+def _write_frames(board: Arduino, frames: List[bytes]) -> None:
+    """Send several pin commands in one serial write + flush."""
+    board.sr.write(b"".join(frames))
+    board.sr.flush()
+
+# pre-encoded pieces of the @fpw/@fpwall frames, so the hot path only concatenates bytes
+_FPW_PREFIX = tuple(b"@fpw%%%d%%" % ch for ch in range(4))
+_CODE_ASCII = tuple(b"%d" % code for code in range(4096))
+
+def _sleep_until(deadline: float) -> None:
+    """
+    Sleep until time.perf_counter() reaches `deadline`. Waits of 2 ms or less
+    are a pure busy-wait and end on time. Longer waits sleep until 1 ms before
+    the deadline and busy-wait the rest, so they only end on time if
+    time.sleep() overshoots by less than 1 ms; a coarse timer tick (up to
+    ~15 ms on Windows) still makes them late.
+    """
+    coarse = deadline - time.perf_counter() - 1e-3
+    if coarse > 1e-3:
+        time.sleep(coarse)
+    while time.perf_counter() < deadline:
+        pass
 
 class ArduinoController:
     """
@@ -18,6 +59,7 @@ class ArduinoController:
             baudrate: Serial communication speed
         """
         self.board = Arduino(baudrate, port=port)
+        set_low_latency(self.board.sr)
         self.piezo = PiezoInterface(self.board)
         self.ttl = TTLInterface(self.board)
     
@@ -45,8 +87,10 @@ class PiezoInterface:
             board: Arduino instance (shared with parent controller)
             pins: Pin mapping dict (uses defaults if None)
             vref: Reference voltage (maps 0..vref volts → 0..4095 code)
-            cs_pulse_s: Chip select pulse width
-            setup_s: Setup time before chip select
+            cs_pulse_s: Chip select pulse width (informational; the @fpw
+                handler in the firmware generates the pulse)
+            setup_s: Setup time before chip select (informational; enforced
+                in firmware, since host-side sleeps cannot resolve ns)
         """
         self.board = board
         self.pins = pins or {
@@ -60,63 +104,78 @@ class PiezoInterface:
         self.vref = float(vref)
         self.cs_pulse_s = float(cs_pulse_s)
         self.setup_s = float(setup_s)
+        self._staged = (0, 0)
+        self._last_code: List[Optional[int]] = [None] * 4  # last code written per channel
+        # perf_counter() when the last frame has finished going out: the settle
+        # counts from there, not from when the frame was queued
+        self._last_write_t = 0.0
+        self._byte_s = 10.0 / float(getattr(board.sr, "baudrate", 115200) or 115200)  # 8N1
         
         self._init_pins()
     
     def _init_pins(self):
         """Initialize all DAC control pins as outputs."""
-        b, p = self.board, self.pins
-        b.pinMode(p["RESET"], "OUTPUT")
-        b.pinMode(p["RW"], "OUTPUT")
-        b.pinMode(p["CS_N"], "OUTPUT")
-        b.pinMode(p["A0"], "OUTPUT")
-        b.pinMode(p["A1"], "OUTPUT")
-        for pin in p["DB"]:
-            b.pinMode(pin, "OUTPUT")
+        p = self.pins
+        frames = [_pin_mode_frame(p[name], "OUTPUT") for name in ("RESET", "RW", "CS_N", "A0", "A1")]
+        frames += [_pin_mode_frame(pin, "OUTPUT") for pin in p["DB"]]
         
         # Set idle state
-        b.digitalWrite(p["RW"], "HIGH")      # write mode ready
-        b.digitalWrite(p["CS_N"], "HIGH")    # chip not selected
-        b.digitalWrite(p["RESET"], "HIGH")   # not in reset
+        frames += [
+            _digital_write_frame(p["RW"], "HIGH"),      # write mode ready
+            _digital_write_frame(p["CS_N"], "HIGH"),    # chip not selected
+            _digital_write_frame(p["RESET"], "HIGH"),   # not in reset
+        ]
+        _write_frames(self.board, frames)
     
     def _set_bits(self, ch_idx_0_3: int, code_12: int, *, verbose: bool = False):
         """
-        Set address and data lines for DAC write.
+        Stage address and data for the next DAC write.
+        
+        The pins are driven by the firmware when the write is latched, so
+        nothing goes over the serial link here.
         
         Args:
             ch_idx_0_3: Channel index (0-3)
             code_12: 12-bit DAC code (0-4095)
             verbose: Print debug info if True
         """
-        b, p = self.board, self.pins
-        
-        # Channel select A1:A0
-        a0 = "HIGH" if (ch_idx_0_3 & 1) else "LOW"
-        a1 = "HIGH" if ((ch_idx_0_3 >> 1) & 1) else "LOW"
-        b.digitalWrite(p["A0"], a0)
-        b.digitalWrite(p["A1"], a1)
-        
         if verbose:
-            print(f"ch_idx={ch_idx_0_3} A1({p['A1']})={a1} A0({p['A0']})={a0}  "
+            a0 = _LEVELS[ch_idx_0_3 & 1]
+            a1 = _LEVELS[(ch_idx_0_3 >> 1) & 1]
+            print(f"ch_idx={ch_idx_0_3} A1={a1} A0={a0}  "
                   f"code_12=0x{code_12:03X} ({code_12:012b})")
-        
-        # Data bus DB0..DB11 (LSB..MSB)
-        for i, pin in enumerate(p["DB"]):
-            bit = (code_12 >> i) & 1
-            level = "HIGH" if bit else "LOW"
-            b.digitalWrite(pin, level)
-            if verbose:
-                print(f"DB{i}({pin})={level}")
+        self._staged = (ch_idx_0_3, code_12)
     
-    def _latch(self):
-        """Pulse chip select to latch data into DAC."""
-        b, p = self.board, self.pins
-        b.digitalWrite(p["RW"], "LOW")       # enter write window
-        time.sleep(self.setup_s)             # setup time
-        b.digitalWrite(p["CS_N"], "LOW")     # activate chip select
-        time.sleep(self.cs_pulse_s)          # latch pulse
-        b.digitalWrite(p["CS_N"], "HIGH")    # deactivate
-        b.digitalWrite(p["RW"], "HIGH")      # exit write window
+    def _latch(self, flush: bool = True):
+        """Latch the staged code into the DAC with a single @fpw command."""
+        ch_idx, code = self._staged
+        self._write_frame(self._fpw_frame(ch_idx, code), flush)
+    
+    def _write_frame(self, frame: bytes, flush: bool) -> None:
+        """
+        Send one frame and record when it is done going out. With flush the
+        send has finished on return; without it the end is estimated from the
+        frame length at the port's baud rate, after any frame still going out.
+        """
+        t_queued = time.perf_counter()
+        self.board.sr.write(frame)
+        if flush:
+            self.board.sr.flush()
+            self._last_write_t = time.perf_counter()
+        else:
+            self._last_write_t = max(t_queued, self._last_write_t) + len(frame) * self._byte_s
+    
+    @staticmethod
+    def _fpw_frame(ch_idx_0_3: int, code_12: int) -> bytes:
+        """Encode one fast piezo write: @fpw%{channel}%{code}$!"""
+        return _FPW_PREFIX[ch_idx_0_3] + _CODE_ASCII[code_12] + b"$!"
+    
+    @staticmethod
+    def _fpwall_frame(codes: List[int]) -> bytes:
+        """Encode a write of all 4 channels: @fpwall%{c1}%{c2}%{c3}%{c4}$!"""
+        c1, c2, c3, c4 = codes
+        return b"@fpwall%" + b"%".join((_CODE_ASCII[c1], _CODE_ASCII[c2],
+                                        _CODE_ASCII[c3], _CODE_ASCII[c4])) + b"$!"
     
     def reset_piezo(self):
         """Hardware reset of the DAC chip."""
@@ -124,22 +183,56 @@ class PiezoInterface:
         b.digitalWrite(p["RESET"], "LOW")
         time.sleep(0.01)  # 10ms reset pulse
         b.digitalWrite(p["RESET"], "HIGH")
+        self._last_code = [None] * 4
 
-    def send_piezo_code(self, channel_1_4: int, code_0_4095: int, *, verbose: bool = False) -> int:
-        """Fast piezo write using single Arduino command"""
+    def send_piezo_code(self, channel_1_4: int, code_0_4095: int, *,
+                        verbose: bool = False, force: bool = False) -> int:
+        """
+        Fast piezo write using single Arduino command.
+        
+        The write is skipped when the channel already holds `code`; pass
+        force=True to rewrite it anyway (e.g. if the actuator has drifted).
+        """
+        return self._send_code(channel_1_4, code_0_4095, verbose=verbose, force=force, flush=True)
+    
+    def send_piezo_code_async(self, channel_1_4: int, code_0_4095: int, *,
+                              force: bool = False) -> int:
+        """
+        Queue a piezo write and return without waiting for it to go out.
+        
+        Call wait_settled() before measuring, so the settle time overlaps
+        with whatever the caller does in between.
+        """
+        return self._send_code(channel_1_4, code_0_4095, verbose=False, force=force, flush=False)
+    
+    def wait_settled(self, settle_s: float):
+        """Finish pending writes and sleep out what is left of settle_s since the last one went out."""
+        t0 = time.perf_counter()
+        self.board.sr.flush()
+        t1 = time.perf_counter()
+        if t1 - t0 > 2e-4:
+            # the flush actually waited for bytes on the wire, so they were only
+            # out at t1 (later than estimated if the adapter lags)
+            self._last_write_t = max(self._last_write_t, t1)
+        _sleep_until(self._last_write_t + settle_s)
+    
+    def _send_code(self, channel_1_4: int, code_0_4095: int, *,
+                   verbose: bool, force: bool, flush: bool) -> int:
         if channel_1_4 not in (1, 2, 3, 4):
             raise ValueError("Channel must be 1-4")
         
         code = int(code_0_4095)
         code = max(0, min(4095, code))
         
+        if not force and self._last_code[channel_1_4 - 1] == code:
+            return code
+        
         if verbose:
             print(f"ch={channel_1_4} code={code} (0x{code:03X}, {code:012b})")
         
-        # Use fast command: @fpw%{channel}%{code}$!
-        cmd_str = f"@fpw%{channel_1_4-1}%{code}$!"
-        self.board.sr.write(str.encode(cmd_str))
-        self.board.sr.flush()
+        self._set_bits(channel_1_4 - 1, code)
+        self._latch(flush)
+        self._last_code[channel_1_4 - 1] = code
         
         return code
     
@@ -161,6 +254,57 @@ class PiezoInterface:
         code = int(round((v / self.vref) * 4095))
         return self.send_piezo_code(channel_1_4, code)
     
+    def send_piezo_codes_bulk(self, codes: List[int], *, force: bool = False) -> List[int]:
+        """
+        Write all 4 channels in one serial frame (no settle).
+        
+        The frame is skipped when every channel already holds its code;
+        pass force=True to rewrite them anyway.
+        
+        Returns:
+            The 4 clamped codes
+        """
+        if len(codes) != 4:
+            raise ValueError("codes must be a list of 4 values")
+        
+        clamped = [max(0, min(4095, int(c))) for c in codes]
+        if not force and self._last_code == clamped:
+            return clamped
+        
+        # Firmware latches channels 1..4 back-to-back from a single command
+        self._write_frame(self._fpwall_frame(clamped), True)
+        self._last_code = clamped
+        return clamped
+    
+    def send_piezo_codes(self, codes: List[int], *, flush: bool = True) -> List[int]:
+        """
+        Bring all 4 channels to `codes` with at most one serial frame (no settle).
+        
+        Only channels whose code differs from what the DAC holds are written:
+        none -> no frame, one -> @fpw, several -> @fpwall. Pass flush=False to
+        return without waiting for the frame to go out (see wait_settled()).
+        
+        Returns:
+            The 4 clamped codes
+        """
+        if len(codes) != 4:
+            raise ValueError("codes must be a list of 4 values")
+        
+        clamped = [max(0, min(4095, int(c))) for c in codes]
+        changed = [i for i in range(4) if self._last_code[i] != clamped[i]]
+        if not changed:
+            return clamped
+        if len(changed) == 1:
+            i = changed[0]
+            self._set_bits(i, clamped[i])
+            self._latch(flush)
+            self._last_code[i] = clamped[i]
+            return clamped
+        
+        self._write_frame(self._fpwall_frame(clamped), flush)
+        self._last_code = clamped
+        return clamped
+    
     def set_all_codes(self, codes: List[int], settle_s: float = 0.01):
         """
         Set all 4 channels to specified codes.
@@ -169,12 +313,8 @@ class PiezoInterface:
             codes: List of 4 DAC codes [ch1, ch2, ch3, ch4]
             settle_s: Settling time after all channels are set
         """
-        if len(codes) != 4:
-            raise ValueError("codes must be a list of 4 values")
-        
-        for ch in range(4):
-            self.send_piezo_code(ch + 1, int(codes[ch]))
-        time.sleep(settle_s)
+        self.send_piezo_codes_bulk(codes)
+        self.wait_settled(settle_s)  # no wait if nothing changed
 
 
 class TTLInterface:
@@ -207,12 +347,13 @@ class TTLInterface:
     
     def _init_pins(self):
         """Initialize all TTL pins."""
-        self.board.pinMode(self.pins["BEAM_SWITCH"], "INPUT")
-        self.board.pinMode(self.pins["TTL_5"], "INPUT")
-        self.board.pinMode(self.pins["TTL_14"], "OUTPUT")
-        
-        # Set TTL 14 to safe initial state (LOW)
-        self.board.digitalWrite(self.pins["TTL_14"], "LOW")
+        _write_frames(self.board, [
+            _pin_mode_frame(self.pins["BEAM_SWITCH"], "INPUT"),
+            _pin_mode_frame(self.pins["TTL_5"], "INPUT"),
+            _pin_mode_frame(self.pins["TTL_14"], "OUTPUT"),
+            # Set TTL 14 to safe initial state (LOW)
+            _digital_write_frame(self.pins["TTL_14"], "LOW"),
+        ])
     
     # ========================================================================
     # Dual-beam control
@@ -240,8 +381,7 @@ class TTLInterface:
         Args:
             state: 0 (LOW) or 1 (HIGH)
         """
-        level = "HIGH" if state == 1 else "LOW"
-        self.board.digitalWrite(self.pins["TTL_14"], level)
+        _write_frames(self.board, [_digital_write_frame(self.pins["TTL_14"], _LEVELS[state == 1])])
     
     def get_ttl14(self) -> int:
         """
@@ -263,8 +403,7 @@ class TTLInterface:
         Args:
             state: 0 (LOW) or 1 (HIGH)
         """
-        level = "HIGH" if state == 1 else "LOW"
-        self.board.digitalWrite(self.pins["TTL_5"], level)
+        _write_frames(self.board, [_digital_write_frame(self.pins["TTL_5"], _LEVELS[state == 1])])
     
     def get_ttl5(self) -> int:
         """
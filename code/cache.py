@@ -0,0 +1,123 @@
+"""Exact-match caches for LLM responses and MCP tool results."""
+import dataclasses
+import functools
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+
+def _jsonable(o):
+    # SDK objects (pydantic models) in message histories, provider Completions
+    if hasattr(o, "model_dump"):
+        return o.model_dump()
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    return str(o)
+
+
+def cache_key(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=_jsonable).encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Response cache keyed on sha256(model, messages, tools).
+
+    Entries live in memory for the lifetime of the client. If a Redis URL is
+    given (or REDIS_URL is set), redis is installed and `decode` rebuilds a
+    response from its JSON dump, entries are shared through Redis as well.
+    """
+
+    def __init__(self, decode: Optional[Callable[[dict], Any]] = None,
+                 redis_url: Optional[str] = None, ttl_s: Optional[int] = None,
+                 max_entries: int = 1024):
+        self._mem: Dict[str, Any] = {}
+        self._max = max_entries
+        self._decode = decode
+        self._ttl = ttl_s
+        self._redis = None
+        url = redis_url or os.getenv("REDIS_URL")
+        if url and decode is not None:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(url)
+            except ImportError:
+                pass
+
+    @staticmethod
+    def key(model: str, messages: list, tools: list) -> str:
+        return cache_key({"model": model, "messages": messages, "tools": tools})
+
+    def _remember(self, key: str, value: Any):
+        if len(self._mem) >= self._max:
+            self._mem.pop(next(iter(self._mem)))  # drop the oldest entry
+        self._mem[key] = value
+
+    async def get(self, key: str):
+        if key in self._mem:
+            return self._mem[key]
+        if self._redis is not None:
+            raw = await self._redis.get("llm:" + key)
+            if raw is not None:
+                value = self._decode(json.loads(raw))
+                self._remember(key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value: Any):
+        self._remember(key, value)
+        if self._redis is not None:
+            await self._redis.set("llm:" + key, json.dumps(value, default=_jsonable), ex=self._ttl)
+
+
+class ToolCache:
+    """
+    Tool result cache keyed on sha256(tool, args).
+
+    Only tools named in `cacheable` are cached, since most tools in these
+    servers read or drive hardware and must run every time. Error results
+    are never cached.
+    """
+
+    def __init__(self, cacheable: Iterable[str] = ()):
+        self.cacheable = frozenset(name for name in cacheable if name)
+        self._mem: Dict[str, Any] = {}
+
+    async def get_or_set(self, name: str, args: dict, call: Callable[[], Awaitable[Any]]):
+        if name not in self.cacheable:
+            return await call()
+        key = cache_key({"tool": name, "args": args})
+        if key in self._mem:
+            return self._mem[key]
+        result = await call()
+        if not getattr(result, "isError", False):
+            self._mem[key] = result
+        return result
+
+
+def ttl_cache(seconds: float = math.inf):
+    """
+    Memoize a function per arguments for `seconds` (forever by default), for
+    instrument reads that rarely change between tool calls. Exceptions are not
+    cached; `fn.cache_clear()` drops every entry, e.g. after a setter.
+    """
+    def decorator(fn):
+        memo: Dict[Any, tuple] = {}
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            hit = memo.get(key)
+            if hit is not None and now < hit[1]:
+                return hit[0]
+            value = fn(*args, **kwargs)
+            memo[key] = (value, now + seconds)
+            return value
+
+        wrapper.cache_clear = memo.clear
+        return wrapper
+    return decorator
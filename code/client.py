@@ -1,24 +1,111 @@
 import asyncio
 from typing import Optional
 from contextlib import AsyncExitStack
+from datetime import timedelta
 
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+import httpx
 
-from anthropic import Anthropic
+from cache import LLMCache, ToolCache, cache_key
+from provider import AnthropicProvider, Completion, LLMProvider
 from dotenv import load_dotenv
 import json
-import time
+import dataclasses
+import itertools
+import os
+import sys
 from datetime import datetime
 
 load_dotenv()  # load environment variables from .env
 
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=str)
+except ImportError:  # orjson is optional; same behaviour with the stdlib
+    def _default(obj):
+        return dataclasses.asdict(obj) if dataclasses.is_dataclass(obj) else str(obj)
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, default=_default).encode()
+
+try:
+    from aioconsole import ainput
+except ImportError:  # aioconsole is optional; read stdin on the default executor
+    async def ainput(prompt: str = "") -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, input, prompt)
+
+# optional fail-fast argument validation against each tool's inputSchema
+try:
+    import fastjsonschema
+
+    _SchemaError = fastjsonschema.JsonSchemaException
+
+    def _compile_validator(schema: dict):
+        return fastjsonschema.compile(schema)
+except ImportError:
+    try:
+        import jsonschema
+
+        _SchemaError = jsonschema.exceptions.SchemaError
+
+        def _compile_validator(schema: dict):
+            validator = jsonschema.validators.validator_for(schema)(schema)
+
+            def validate(args):
+                error = jsonschema.exceptions.best_match(validator.iter_errors(args))
+                if error is not None:
+                    raise ValueError(error.message)
+            return validate
+    except ImportError:
+        _SchemaError = Exception
+        _compile_validator = None
+
+def _error_result(text: str) -> types.CallToolResult:
+    return types.CallToolResult(content=[types.TextContent(type="text", text=text)], isError=True)
+
+@dataclasses.dataclass(slots=True)
+class ToolDetail:
+    """Per-call record kept in usage_stats["tool_calls"] (orjson serializes it natively)"""
+    tool_name: str
+    arguments: dict
+    result: str
+    duration_ms: float
+    success: bool
+
 class MCPClient:
-    def __init__(self):
+    """
+    MCP chat client; the LLM vendor is a pluggable provider (see provider.py).
+
+    Args:
+        provider: LLMProvider adapter (default: AnthropicProvider)
+        max_steps: Cap on model turns per query (None = until no tool calls)
+    """
+    def __init__(self, provider: Optional[LLMProvider] = None, max_steps: Optional[int] = None):
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+        self.provider = provider if provider is not None else AnthropicProvider()
+        self.max_steps = max_steps
+        # bound the fan-out over the single stdio transport
+        self._tool_sem = asyncio.Semaphore(int(os.getenv("MCP_TOOL_CONCURRENCY", "8")))
+        self._tool_retries = int(os.getenv("MCP_TOOL_RETRIES", "2"))
+        # per-call read timeout; without one a request waits for its reply forever
+        timeout_s = os.getenv("MCP_TOOL_TIMEOUT_S")
+        self._tool_timeout = timedelta(seconds=float(timeout_s)) if timeout_s else None
+        # longest tool result the model sees again in later turns (the log keeps 500)
+        self.max_tool_chars = int(os.getenv("MCP_MAX_TOOL_CHARS", "8000"))
+        self._log_q: Optional[asyncio.Queue] = None
+        self._log_task: Optional[asyncio.Task] = None
+        self._tools_dirty = False  # set by a tools/list_changed notification
+        self.llm_cache = LLMCache(decode=Completion.from_dict)
+        # whole-query answers, only for queries that ran no hardware tools
+        self.query_cache = LLMCache()
+        # comma-separated tool names whose results may be reused (default: none)
+        self.tool_cache = ToolCache(os.getenv("MCP_CACHEABLE_TOOLS", "").split(","))
 
     async def connect_to_server(self, server_script_path: str):
         """Connect to an MCP server
@@ -40,75 +127,51 @@ class MCPClient:
         
         stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
         self.stdio, self.write = stdio_transport
-        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
+        self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write, message_handler=self._on_message))
         
         await self.session.initialize()
         
         # List available tools
-        response = await self.session.list_tools()
-        tools = response.tools
-        # print("\nConnected to server with tools:", [tool.name for tool in tools])
-
-    async def process_query(self, query: str, model: str) -> str:
-        """Process a query using Claude and available tools"""
-        messages = [
-            {
-                "role": "user",
-                "content": query
-            }
-        ]
+        await self.refresh_tools()
+        # print("\nConnected to server with tools:", [tool.name for tool in self._tools])
 
+    async def refresh_tools(self):
+        """Fetch the server's tool list and rebuild the cached tool schemas"""
+        self._tools_dirty = False
         response = await self.session.list_tools()
-        available_tools = [{ 
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in response.tools]
-
-        # Initial Claude API call
-        response = self.anthropic.messages.create(
-            model=model,
-            max_tokens=1000,
-            messages=messages,
-            tools=available_tools
-        )
-
-        # Process response and handle tool calls
-        final_text = []
-
-        # print(response.content)
-        for content in response.content:
-            if content.type == 'text':
-                final_text.append(content.text)
-            elif content.type == 'tool_use':
-                tool_name = content.name
-                tool_args = content.input
-                
-                # Execute tool call
-                result = await self.session.call_tool(tool_name, tool_args)
-                final_text.append(f"[Calling tool {tool_name} with args {tool_args}]")
-
-                # Continue conversation with tool results
-                if hasattr(content, 'text') and content.text:
-                    messages.append({
-                      "role": "assistant",
-                      "content": content.text
-                    })
-                messages.append({
-                    "role": "user", 
-                    "content": result.content
-                })
-
-                # Get next response from Claude
-                response = self.anthropic.messages.create(
-                    model=model,
-                    max_tokens=1000,
-                    messages=messages,
-                )
-
-                final_text.append(response.content[0].text)
-
-        return "\n".join(final_text)
+        self._tools = response.tools
+        self._tool_schema = self.provider.tool_schema(self._tools)
+        self._tool_by_name = {t.name: t for t in self._tools}
+        self._validators = {}  # tool name -> compiled inputSchema validator, built on first use
+
+    def _validate_args(self, tool_name: str, tool_args: dict) -> Optional[str]:
+        """Error message if the call cannot succeed, checked before any round trip to the server"""
+        tool = self._tool_by_name.get(tool_name)
+        if tool is None:
+            return f"Error: unknown tool {tool_name}"
+        if _compile_validator is None or not tool.inputSchema:
+            return None
+        if tool_name not in self._validators:
+            try:
+                self._validators[tool_name] = _compile_validator(tool.inputSchema)
+            except _SchemaError:
+                self._validators[tool_name] = None  # schema the validator cannot handle; let the server decide
+        validate = self._validators[tool_name]
+        if validate is None:
+            return None
+        try:
+            validate(tool_args)
+        except ValueError as e:
+            return f"Error: invalid arguments for {tool_name}: {e}"
+        return None
+
+    async def _on_message(self, message):
+        # only re-list tools when the server says the list changed. The handler
+        # runs inside the session's receive loop, so a request sent from here
+        # could never read its reply: flag it and re-list before the next query.
+        if isinstance(message, types.ServerNotification) and \
+                isinstance(message.root, types.ToolListChangedNotification):
+            self._tools_dirty = True
 
     async def chat_loop(self, model: str = "claude-3-haiku-20240307"):
         """Run an interactive chat loop"""
@@ -117,28 +180,31 @@ class MCPClient:
         print("Type your queries or 'quit' to exit.")
         
         log_file = "mcp_client.jsonl"
+        loop = asyncio.get_running_loop()
+        await self.start_logging(log_file)
 
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await ainput("\nQuery: ")).strip()
                 
                 if query.lower() == 'quit':
                     break
                 
-                start_time = time.time()
+                start_time = loop.time()
                 
                 try:
+                    print()
                     final_chunks, usage = await self.process_query_new(query, model)
-                    print("\n" + "".join(final_chunks))
+                    print()  # output was streamed by process_query_new
                     print(f"Token Usage: {{'prompt_tokens': {usage['prompt_tokens']}, 'completion_tokens': {usage['completion_tokens']}, 'total_tokens': {usage['total_tokens']}}}")
                     log_entry = {
                         "timestamp": datetime.now().isoformat(),
                         "query": query,
-                        "provider": "Anthropic",
+                        "provider": self.provider.name,
                         "model": model,
                         "response": "".join(final_chunks),
                         "usage": usage,
-                        "duration_ms": (time.time() - start_time) * 1000,
+                        "duration_ms": (loop.time() - start_time) * 1000,
                         "success": True
                     }
                 except Exception as e:
@@ -146,101 +212,179 @@ class MCPClient:
                     log_entry = {
                         "timestamp": datetime.now().isoformat(),
                         "query": query,
-                        "provider": "Anthropic",
+                        "provider": self.provider.name,
                         "model": model,
                         "error": str(e),
-                        "duration_ms": (time.time() - start_time) * 1000,
+                        "duration_ms": (loop.time() - start_time) * 1000,
                         "success": False
                     }
-                with open(log_file, 'a') as f:
-                    f.write(json.dumps(log_entry) + '\n')
+                self._log_q.put_nowait(log_entry)
             except Exception as e:
                 print(f"\nError: {str(e)}")
     
+    async def start_logging(self, log_file: str = "mcp_client.jsonl"):
+        """Start the background task that appends log entries to log_file"""
+        if self._log_task is None:
+            self._log_q = asyncio.Queue()
+            self._log_task = asyncio.create_task(self._log_writer(log_file))
+
+    async def _log_writer(self, log_file: str):
+        # one open file for the session; whatever is queued goes out in one write
+        with open(log_file, 'ab', buffering=1 << 16) as f:
+            while True:
+                batch = [await self._log_q.get()]
+                while not self._log_q.empty() and len(batch) < 256:
+                    batch.append(self._log_q.get_nowait())
+                f.write(b"".join(_dumps(entry) + b'\n' for entry in batch))
+                f.flush()
+                for _ in batch:
+                    self._log_q.task_done()
+
     async def cleanup(self):
         """Clean up resources"""
+        if self._log_task is not None:
+            await self._log_q.join()  # drain pending log entries
+            self._log_task.cancel()
+            try:
+                await self._log_task
+            except asyncio.CancelledError:
+                pass
+        await self.provider.aclose()
         await self.exit_stack.aclose()
 
-    async def process_query_new(self, query: str, model: str) -> list[str]:
+    async def _bounded_call(self, tool_name: str, tool_args: dict):
+        """
+        session.call_tool under the concurrency limit. A timed-out request may
+        still have run on the device, so only the side-effect-free tools in
+        the cacheable allowlist are retried. A dropped transport
+        (anyio ClosedResourceError / BrokenResourceError) is never retried:
+        the session is gone.
+        """
+        retries = self._tool_retries if tool_name in self.tool_cache.cacheable else 0
+        for attempt in range(retries + 1):
+            try:
+                async with self._tool_sem:
+                    return await self.session.call_tool(tool_name, tool_args,
+                                                        read_timeout_seconds=self._tool_timeout)
+            except McpError as e:
+                # mcp reports its own request timeout as an McpError with this code
+                if e.error.code != httpx.codes.REQUEST_TIMEOUT or attempt == retries:
+                    raise
+                await asyncio.sleep(0.2 * 2 ** attempt)
+
+    async def _timed_call_tool(self, tool_name: str, tool_args: dict):
+        """Call an MCP tool and return (result, duration_ms)"""
+        error = self._validate_args(tool_name, tool_args)
+        if error is not None:
+            return _error_result(error), 0.0
+        loop = asyncio.get_running_loop()
+        tool_start = loop.time()
+        result = await self.tool_cache.get_or_set(
+            tool_name, tool_args, lambda: self._bounded_call(tool_name, tool_args))
+        return result, (loop.time() - tool_start) * 1000
+
+    @staticmethod
+    def _emit(text: str):
+        """Write streamed output to the terminal as soon as it is available"""
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def _dispatch_tool(self, inflight: dict, tool_name: str, tool_args: dict):
+        """Start a tool call, or reuse the identical (name, args) call already started this turn"""
+        key = cache_key({"tool": tool_name, "args": tool_args})
+        if key not in inflight:
+            self._emit(f"[Called tool {tool_name} with args {_dumps(tool_args).decode()}]")
+            inflight[key] = asyncio.ensure_future(self._timed_call_tool(tool_name, tool_args))
+        return inflight[key]
+
+    async def process_query_new(self, query: str, model: str) -> tuple[list[str], dict]:
         messages = [{"role": "user", "content": query}]
 
-        resp = await self.session.list_tools()
-        available_tools = [{
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in resp.tools]
+        if self._tools_dirty:
+            await self.refresh_tools()
+        tool_schema = self._tool_schema
 
         final_chunks: list[str] = []
         usage_stats = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "tool_calls": []}
 
-        while True:
-            response = self.anthropic.messages.create(
-                model=model,
-                max_tokens=1000,
-                messages=messages,
-                tools=available_tools
-            )
-
-            if hasattr(response, 'usage'):
-                usage_stats["prompt_tokens"] += response.usage.input_tokens
-                usage_stats["completion_tokens"] += response.usage.output_tokens
-                usage_stats["total_tokens"] += (response.usage.input_tokens + response.usage.output_tokens)
-
-            tool_uses = [c for c in response.content if getattr(c, "type", None) == "tool_use"]
-
-            if not tool_uses:
-                for c in response.content:
-                    if getattr(c, "type", None) == "text" and getattr(c, "text", None):
-                        final_chunks.append(c.text)
+        # answer without an LLM call when possible
+        q = query.strip()
+        if not q:
+            return ["(empty query)"], usage_stats
+        query_key = cache_key({"model": model, "query": q, "tools": [t.name for t in self._tools]})
+        hit = await self.query_cache.get(query_key)
+        if hit is not None:
+            self._emit("".join(hit))
+            usage_stats["cached"] = True
+            return list(hit), usage_stats
+        tools_used = set()
+
+        steps = itertools.count() if self.max_steps is None else range(self.max_steps)
+        for _ in steps:
+            llm_key = LLMCache.key(model, messages, tool_schema)
+            completion = await self.llm_cache.get(llm_key)
+            inflight = {}  # (tool, args) key -> task, shared by duplicate calls
+            if completion is None:
+                # tool calls start as soon as the provider has seen them in the stream
+                try:
+                    completion = await self.provider.complete(
+                        model, messages, tool_schema,
+                        on_text=self._emit,
+                        on_tool_call=lambda call: self._dispatch_tool(inflight, call.name, call.arguments),
+                    )
+                except BaseException:
+                    for task in inflight.values():
+                        task.cancel()
+                    raise
+                await self.llm_cache.set(llm_key, completion)
+            else:
+                self._emit("".join(completion.text_chunks))
+
+            for k in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                usage_stats[k] += completion.usage[k]
+            final_chunks.extend(completion.text_chunks)
+
+            if not completion.tool_calls:
                 break
 
-            tool_results_blocks = []
-            tool_details = []
-
-            for tu in tool_uses:
-                tool_name = tu.name
-                tool_args = tu.input
-                tool_use_id = tu.id
-
-                tool_start = time.time()
-                result = await self.session.call_tool(tool_name, tool_args)
-                tool_duration = (time.time() - tool_start) * 1000
-
+            # run all tool calls of this turn concurrently, once per distinct (name, args)
+            # and reusing the ones already started while streaming; results keep the
+            # request order, duplicates share one result
+            timed_results = await asyncio.gather(*(
+                self._dispatch_tool(inflight, call.name, call.arguments)
+                for call in completion.tool_calls
+            ))
+
+            n = len(completion.tool_calls)
+            tool_details = [None] * n
+            result_texts = [None] * n
+            for i, (call, (result, tool_duration)) in enumerate(zip(completion.tool_calls, timed_results)):
                 result_text = getattr(result, "content", "")
                 if not isinstance(result_text, str):
                     result_text = str(result_text)
 
-                final_chunks.append(f"[Called tool {tool_name} with args {json.dumps(tool_args, ensure_ascii=False)}]")
+                final_chunks.append(f"[Called tool {call.name} with args {_dumps(call.arguments).decode()}]")
                 final_chunks.append(result_text)
+                self._emit(result_text)
+
+                tool_details[i] = ToolDetail(
+                    tool_name=call.name,
+                    arguments=call.arguments,
+                    result=result_text[:500],
+                    duration_ms=tool_duration,
+                    success=not getattr(result, 'isError', False),
+                )
+                if len(result_text) > self.max_tool_chars:
+                    result_text = (result_text[:self.max_tool_chars]
+                                   + f"\n...[truncated {len(result_text) - self.max_tool_chars} chars]")
+                result_texts[i] = result_text
+
+            messages.extend(self.provider.turn_messages(completion, result_texts))
 
-                tool_details.append({
-                    "tool_name": tool_name,
-                    "arguments": tool_args,
-                    "result": result_text[:500],
-                    "duration_ms": tool_duration,
-                    "success": not getattr(result, 'isError', False)
-                })
-
-                tool_results_blocks.append({
-                    "type": "tool_result",
-                    "tool_use_id": tool_use_id,
-                    "content": result_text,
-                })
-
-            messages.extend([
-                {
-                    "role": "assistant",
-                    "content": response.content
-                },
-                {
-                    "role": "user",
-                    "content": tool_results_blocks
-                }
-            ])
-
-            if tool_details:
-                usage_stats["tool_calls"] = tool_details
+            usage_stats["tool_calls"] = tool_details
+            tools_used.update(d.tool_name for d in tool_details)
+        if tools_used <= self.tool_cache.cacheable:
+            await self.query_cache.set(query_key, list(final_chunks))
         return final_chunks, usage_stats
 
 async def main():
@@ -256,5 +400,4 @@ async def main():
         await client.cleanup()
 
 if __name__ == "__main__":
-    import sys
     asyncio.run(main())
@@ -1,74 +1,281 @@
 from __future__ import annotations
-import math, time, csv
+import time, math
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
 from typing import List, Tuple, Optional, Dict
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
 def _iclamp(v: int, lo: int, hi: int) -> int:
     return lo if v < lo else hi if v > hi else v
 
+def _trial_codes(codes: List[int], step: int, lo: int, hi: int,
+                 plus: List[int], minus: List[int]) -> None:
+    """Fill `plus` / `minus` in place with the clamped +step / -step candidate of every channel"""
+    for i, c in enumerate(codes):
+        plus[i] = _iclamp(c + step, lo, hi)
+        minus[i] = _iclamp(c - step, lo, hi)
+
+def _descent_codes(codes: List[int], grad: List[float], step: int, lo: int, hi: int,
+                   out: List[int]) -> None:
+    """Fill `out` with every channel moved one step against the sign of its gradient, clamped"""
+    for i, (c, g) in enumerate(zip(codes, grad)):
+        out[i] = _iclamp(c - step if g > 0 else c + step if g < 0 else c, lo, hi)
+
 def _set_all_codes(piezo, codes: List[int], settle_s: float) -> None:
     t0 = time.perf_counter()
-    for ch in range(4):
-        piezo.send_piezo_code(ch + 1, _iclamp(int(codes[ch]), 0, 4095))
-    time.sleep(settle_s)
+    piezo.send_piezo_codes_bulk([_iclamp(int(c), 0, 4095) for c in codes])
+    piezo.wait_settled(settle_s)  # only sleeps if a frame actually went out
     dt = time.perf_counter() - t0
     print(f"    [TIMING] _set_all_codes: {dt*1000:.1f} ms (settle={settle_s*1000:.1f} ms)")
 
 def _set_one_code(piezo, channel, code, settle_s):
     t0 = time.perf_counter()
     piezo.send_piezo_code(channel, _iclamp(int(code), 0, 4095))
-    time.sleep(settle_s)
+    piezo.wait_settled(settle_s)
     dt = time.perf_counter() - t0
     print(f"    [TIMING] _set_one_code ch={channel}: {dt*1000:.1f} ms (settle={settle_s*1000:.1f} ms)")
 
+def _no_clock() -> float:
+    return 0.0
+
+def _set_and_read(piezo, pod, codes, settle_s, now=time.perf_counter):
+    """
+    Bring the channels to `codes` in one frame, wait out the settle, read the
+    polarimeter -> (pol, read_latency_us). A channel still off its code from
+    the previous probe is restored in the same frame as this probe's write.
+    """
+    piezo.send_piezo_codes(codes, flush=False)
+    return _settle_and_read(piezo, pod, settle_s, now)
+
+def _settle_and_read(piezo, pod, settle_s, now=time.perf_counter):
+    """
+    Second half of _set_and_read, for a frame queued earlier with
+    send_piezo_codes(flush=False): whatever ran since then counts toward the settle.
+    """
+    piezo.wait_settled(settle_s)
+    t0 = now()
+    pol = pod.read_pol()
+    return pol, (now() - t0) * 1e6
+
+def _calibrate_settle(piezo, pod, codes, steps_codes, max_settle_s, *,
+                     min_code=0, max_code=4095, noise_deg=0.05, poll_s=1e-3,
+                     still_reads=2):
+    """
+    Measure how long the polarization takes to stop moving after a step of
+    each size in steps_codes (on channel 1, starting from `codes`).
+
+    A step counts as settled once the reading has left the pre-step state
+    and then `still_reads` successive reads agree within noise_deg, so a
+    piezo that lags the write is not taken for one already at rest. The
+    settle time runs to the first read of that still run.
+
+    Returns one settle time per step size, capped at max_settle_s. Leaves
+    the channels at `codes`.
+    """
+    table = []
+    for step in steps_codes:
+        code = _iclamp(codes[0] + int(step), min_code, max_code)
+        base = pod.read_pol()
+        piezo.send_piezo_code(1, code)
+        t_write = time.perf_counter()
+        settled = max_settle_s
+        prev = t_run = None  # t_run: start of the first read of the current still run
+        still = 0
+        while True:
+            t_read = time.perf_counter()
+            cur = pod.read_pol()
+            if t_run is None:
+                if _dist_ang(base, cur) >= noise_deg:  # has started moving
+                    t_run = t_read
+            elif _dist_ang(prev, cur) < noise_deg:
+                still += 1
+                if still >= still_reads:
+                    settled = t_run - t_write
+                    break
+            else:
+                t_run, still = t_read, 0
+            if t_read - t_write >= max_settle_s:
+                break
+            prev = cur
+            time.sleep(poll_s)
+        table.append(min(settled, max_settle_s))
+        piezo.send_piezo_code(1, codes[0])
+        piezo.wait_settled(max_settle_s)
+    return table
+
+@njit(cache=True)
+def _dist_ang_sq_kernel(tp, tc, mp, mc):
+    # smallest rotation on the 180 deg period: ((a - b + 90) % 180) - 90, no branches
+    dpsi = ((mp - tp + 90.0) % 180.0) - 90.0
+    dchi = ((mc - tc + 90.0) % 180.0) - 90.0
+    return dpsi * dpsi + dchi * dchi
+
+@njit(cache=True)
+def _decide_next(code, step, lo, hi, d_plus_sq, d_minus_sq, base_sq):
+    """
+    Coordinate-sweep decision for one channel after its two probes.
+    Returns (accept, new_code): accept is 1 for +step, -1 for -step, 0 to keep `code`.
+    """
+    if d_plus_sq < base_sq:
+        return 1, min(max(code + step, lo), hi)
+    if d_minus_sq < base_sq:
+        return -1, min(max(code - step, lo), hi)
+    return 0, code
+
+@njit(cache=True, fastmath=True)
+def psi_chi_to_stokes(psi_deg, chi_deg):
+    """(psi, chi) in degrees -> unit Stokes vector (s1, s2, s3) on the Poincare sphere"""
+    p = math.radians(psi_deg) * 2.0
+    c = math.radians(chi_deg) * 2.0
+    cc = math.cos(c)
+    return cc * math.cos(p), cc * math.sin(p), math.sin(c)
+
+@lru_cache(maxsize=32)
+def target_stokes(psi_deg: float, chi_deg: float) -> Tuple[float, float, float]:
+    """
+    psi_chi_to_stokes for a stabilization target, memoized: successive runs
+    in a sweep usually aim at the same few states.
+    """
+    return tuple(map(float, psi_chi_to_stokes(float(psi_deg), float(chi_deg))))
+
+@njit(cache=True, fastmath=True)
+def _dist_sphere_sq_kernel(s1, s2, s3, mp, mc):
+    # target as a precomputed Stokes vector, so only the measurement is converted.
+    # Half the arc between the two points is in the same degrees as psi/chi and
+    # stays defined near the poles, where psi is meaningless.
+    m1, m2, m3 = psi_chi_to_stokes(mp, mc)
+    dot = s1 * m1 + s2 * m2 + s3 * m3
+    d = math.acos(min(1.0, max(-1.0, dot))) * (90.0 / math.pi)
+    return d * d
+
+def _dist_ang_sq(target_angles, meas):
+    return _dist_ang_sq_kernel(float(target_angles[-2]), float(target_angles[-1]),
+                               float(meas[1]), float(meas[2]))
+
+def _dist_sphere_sq(target_vec, meas):
+    return _dist_sphere_sq_kernel(target_vec[0], target_vec[1], target_vec[2],
+                                  float(meas[1]), float(meas[2]))
+
 def _dist_ang(target_angles, meas):
-    def angdiff_deg(a, b, period=180.0):
-        d = (a - b) % period
-        return d - period if d > period/2 else d
-    if len(target_angles) == 3:
-        _, tp, tc = target_angles
-    else:
-        tp, tc = target_angles
-    _, mp, mc = meas
-    dpsi = angdiff_deg(mp, tp, 180.0)
-    dchi = angdiff_deg(mc, tc, 180.0)
-    return math.hypot(dpsi, dchi)
-
-def _ensure_csv(path: Path) -> None:
-    with path.open("w", newline="") as f:
-        csv.writer(f).writerow([
-            "event", "channel",
-            "time",
-            "target_dop","target_psi","target_chi",
-            "curr_dop","curr_psi","curr_chi",
-            "distance","step_codes","c1","c2","c3","c4",
-            "read_latency_us",
-        ])
-
-def _append_csv(path: Path,
-                event: str,
-                channel: int,
-                target: Tuple[float, float, float],
-                current: Tuple[float, float, float],
-                distance: float,
-                step_codes: int,
-                codes: List[int],
-                read_latency_us: float = float("nan"), 
-                ) -> None:
-    with path.open("a", newline="") as f:
-        csv.writer(f).writerow([
-            event, int(channel),
-            datetime.now().isoformat(timespec="microseconds"),
-            f"{target[0]:.6f}", f"{target[1]:.3f}", f"{target[2]:.3f}",
-            f"{current[0]:.6f}", f"{current[1]:.3f}", f"{current[2]:.3f}",
-            f"{distance:.6f}", int(step_codes),
-            int(codes[0]), int(codes[1]), int(codes[2]), int(codes[3]),
-            f"{read_latency_us:.1f}",
-        ])
+    return _dist_ang_sq(target_angles, meas) ** 0.5
+
+_METRICS = {"angles": _dist_ang_sq, "sphere": _dist_sphere_sq}
+
+def warm_kernels() -> None:
+    """
+    Compile (or load from numba's on-disk cache) every njit kernel with the
+    argument types the control loop uses, so the first run does not wait for it.
+    """
+    _dist_ang_sq_kernel(0.0, 0.0, 0.0, 0.0)
+    _dist_sphere_sq_kernel(1.0, 0.0, 0.0, 0.0, 0.0)
+    psi_chi_to_stokes(0.0, 0.0)
+    _decide_next(0, 1, 0, 1, 0.0, 0.0, 0.0)
+
+_CSV_HEADER = [
+    "event", "channel",
+    "time",
+    "target_dop","target_psi","target_chi",
+    "curr_dop","curr_psi","curr_chi",
+    "distance","step_codes","c1","c2","c3","c4",
+    "read_latency_us",
+]
+
+# one row after the target cells are filled in: event,channel,time,<target>,
+# curr_dop,curr_psi,curr_chi,distance,step_codes,c1..c4,read_latency_us.
+# Events are fixed identifiers, so no cell ever needs CSV quoting.
+_ROW_FMT = b"%s,%d,%.6f,{target},%.6f,%.3f,%.3f,%.6f,%d,%d,%d,%d,%d,%.1f\r\n"
+
+# rows kept when log_verbose=False: the state the controller actually moves
+# through, without the rejected probes and trial steps around it
+_STATE_EVENTS = frozenset({"init", "accept_plus", "accept_minus", "accept_step", "round_eval"})
+
+class _CsvLogger:
+    """
+    Control-loop CSV log, opened once per run in binary append mode. Rows are
+    rendered with one bytes %-format each into a reused bytearray, which goes
+    out in one write() once it passes `flush_bytes` and on close().
+    """
+
+    def __init__(self, path: Path, target: Tuple[float, float, float], flush_bytes: int = 1 << 15):
+        self._f = path.open("ab", buffering=1 << 16)
+        self._buf = bytearray()
+        self._flush_bytes = flush_bytes
+        self._events: Dict[str, bytes] = {}
+        if self._f.tell() == 0:  # new file (or reset_log): header first
+            self._buf += (",".join(_CSV_HEADER) + "\r\n").encode("ascii")
+        # the target is fixed for the run, so its cells are baked into the format once
+        self._fmt = _ROW_FMT.replace(
+            b"{target}", f"{target[0]:.6f},{target[1]:.3f},{target[2]:.3f}".encode("ascii"))
+        # "time" is Unix seconds: one wall-clock reading here, perf_counter() offsets after
+        self._t_offset = time.time() - time.perf_counter()
+
+    def _event(self, event: str) -> bytes:
+        b = self._events.get(event)
+        if b is None:
+            b = self._events[event] = event.encode("ascii")
+        return b
+
+    def append(self,
+               event: str,
+               channel: int,
+               current: Tuple[float, float, float],
+               distance: float,
+               step_codes: int,
+               codes: List[int],
+               read_latency_us: float = float("nan"),
+               ) -> None:
+        self._buf += self._fmt % (
+            self._event(event), channel,
+            self._t_offset + time.perf_counter(),
+            current[0], current[1], current[2],
+            distance, step_codes,
+            codes[0], codes[1], codes[2], codes[3],
+            read_latency_us,
+        )
+        if len(self._buf) >= self._flush_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buf:
+            self._f.write(self._buf)
+            self._buf.clear()
+        self._f.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._f.close()
+
+# one row per state the controller moves through (the _STATE_EVENTS rows of the CSV)
+_TRAJ_DTYPE = np.dtype([("t", "f8"), ("dop", "f4"), ("psi", "f4"), ("chi", "f4"),
+                        ("distance", "f4"), ("step", "i2"),
+                        ("c1", "i2"), ("c2", "i2"), ("c3", "i2"), ("c4", "i2")])
+
+class _Trajectory:
+    """State rows of one run in a structured array allocated up front."""
+
+    def __init__(self, capacity: int):
+        self._rows = np.empty(capacity, dtype=_TRAJ_DTYPE)
+        self._n = 0
+        self._t_offset = time.time() - time.perf_counter()  # "t" is Unix seconds, as in the CSV
+
+    def append(self, pol, distance: float, step: int, codes: List[int]) -> None:
+        self._rows[self._n] = (self._t_offset + time.perf_counter(), pol[0], pol[1], pol[2],
+                               distance, step, codes[0], codes[1], codes[2], codes[3])
+        self._n += 1
+
+    def array(self) -> np.recarray:
+        return self._rows[:self._n].view(np.recarray)
 
 def run_control_single_beam(
     arduino,
@@ -79,17 +286,62 @@ def run_control_single_beam(
     thresh=(30.0, 15.0, 5.0, 2.0, 0.5),
     stop_threshold=0.5,
     settle_s=0.01,
+    settle_s_per_step: Optional[List[float]] = None,
     init_code=2048,
     min_code=0,
     max_code=4095,
     max_rounds=400,
     log_path: Optional[str] = None,
     reset_log: bool = True,
+    log_verbose: bool = False,
     verbose_timing: bool = False,
+    method: str = "coordinate",
+    max_backtracks: int = 3,
+    calibrate_settle: bool = False,
+    metric: str = "angles",
+    target_vec: Optional[Tuple[float, float, float]] = None,
+    greedy_accept: bool = False,
+    return_trajectory: bool = False,
 ) -> Dict[str, object]:
-    
+    """
+    Drive the 4 piezo channels until the measured (psi, chi) is within
+    stop_threshold degrees of `target`.
+
+    method="coordinate" probes +/-step on each channel and keeps whichever
+    improves (2 probes per channel); with greedy_accept=True the round ends
+    early once an accepted channel brings the error under half the current
+    stage's thresh. method="gradient" probes +step once per
+    channel and takes one combined 4-channel step against the finite-difference
+    gradient, backtracking up to max_backtracks times.
+
+    settle_s_per_step gives one settle time per entry of steps_codes, so the
+    fine stages wait less than the coarse ones; without it every step waits
+    settle_s. With calibrate_settle=True the settle time per step size is
+    instead measured once up front (never longer than settle_s).
+
+    metric="angles" scores the wrapped (psi, chi) differences; metric="sphere"
+    scores half the angle between the Poincare-sphere vectors, which agrees
+    for small offsets and does not blow up near circular polarization. The
+    target's Stokes vector is taken from target_vec when the caller already
+    has it (see target_stokes), else computed once here.
+
+    The CSV log holds only the accepted steps and each round's eval read
+    unless log_verbose=True, which also logs every baseline, probe and
+    rejected trial.
+
+    With return_trajectory=True the result also holds "trajectory", a
+    numpy recarray of the same state rows (t, dop, psi, chi, distance, step,
+    c1..c4) for analysis without going through the CSV.
+    """
     if len(steps_codes) != len(thresh):
         raise ValueError("steps_codes and thresh must have the same length")
+    if settle_s_per_step is not None and len(settle_s_per_step) != len(steps_codes):
+        raise ValueError("settle_s_per_step and steps_codes must have the same length")
+    if method not in ("coordinate", "gradient"):
+        raise ValueError("method must be 'coordinate' or 'gradient'")
+    if metric not in _METRICS:
+        raise ValueError("metric must be 'angles' or 'sphere'")
+    dist_sq = _METRICS[metric]
 
     if len(target) == 2:
         tp, tc = map(float, target)
@@ -100,132 +352,257 @@ def run_control_single_beam(
         target_full = (td, tp, tc)
     else:
         raise ValueError("Invalid target format.")
+    if metric == "sphere":
+        # the target is fixed for the run: convert it once, not on every read
+        if target_vec is None:
+            target_vec = target_stokes(tp, tc)
+        target_ref = tuple(map(float, target_vec))
+    else:
+        target_ref = target_full
 
     piezo = arduino.piezo
 
     stored = [_iclamp(init_code, min_code, max_code)] * 4
     _set_all_codes(piezo, stored, settle_s)
 
-    csv_path = Path(log_path) if log_path else None
+    if calibrate_settle:
+        settle_table = _calibrate_settle(piezo, pod, stored, steps_codes, settle_s,
+                                         min_code=min_code, max_code=max_code)
+        print("[settle] " + ", ".join(f"step {st}: {t*1000:.1f} ms"
+                                      for st, t in zip(steps_codes, settle_table)))
+    elif settle_s_per_step is not None:
+        settle_table = [float(t) for t in settle_s_per_step]
+    else:
+        settle_table = [settle_s] * len(steps_codes)
 
-    def log(event, channel, pol, dist, latency_us):
-        if csv_path:
-            _append_csv(csv_path, event, channel,
-                        target_full, pol, dist, step_now, stored,
-                        read_latency_us=latency_us)
+    csv_path = Path(log_path) if log_path else None
+    logger = None
+    # at most 4 accepts and the eval read per round, plus the init read
+    traj = _Trajectory(1 + 5 * max_rounds) if return_trajectory else None
+
+    # the sweep compares squared distances; the root is only taken for the log
+    def log(event, channel, pol, dist_sq, latency_us):
+        if traj is not None and event in _STATE_EVENTS:
+            traj.append(pol, dist_sq ** 0.5, step_now, stored)
+        if logger and (log_verbose or event in _STATE_EVENTS):
+            logger.append(event, channel, pol, dist_sq ** 0.5, step_now, stored,
+                          read_latency_us=latency_us)
+
+    def done(result):
+        if traj is not None:
+            result["trajectory"] = traj.array()
+        return result
 
     if csv_path:
         if reset_log and csv_path.exists():
             csv_path.unlink()
-        _ensure_csv(csv_path)
-        t0 = time.perf_counter()
-        p0 = pod.read_pol()
-        dt_init = (time.perf_counter() - t0) * 1e6
-        _append_csv(csv_path, "init", 0, target_full, p0, _dist_ang(target_full, p0), 0, stored,
-                    read_latency_us=dt_init)
-
-    step_idx = 0
-    for rnd in range(1, max_rounds + 1):
-        round_t0 = time.perf_counter()
-        step_now = int(steps_codes[step_idx])
-
-        t0 = time.perf_counter()
-        baseline_pol = pod.read_pol()
-        dt_baseline = (time.perf_counter() - t0) * 1e6
-        baseline_err = _dist_ang(target_full, baseline_pol)
-        if verbose_timing:
-            print(f"  [TIMING] Baseline read: {dt_baseline:.1f} us")
-        log("baseline", 0, baseline_pol, baseline_err, dt_baseline)
-
-        t0_sweep = time.perf_counter()
-        for ch in range(4):
-            if verbose_timing:
-                print(f"  [Ch {ch+1}]")
-
-            plus = stored[:]
-            plus[ch] = _iclamp(plus[ch] + step_now, min_code, max_code)
-            _set_one_code(piezo, ch+1, plus[ch], settle_s)
-
-            t0 = time.perf_counter()
-            pol_plus = pod.read_pol()
-            dt_read = (time.perf_counter() - t0) * 1e6
-            if verbose_timing:
-                print(f"    [TIMING] Read (+): {dt_read:.1f} us")
-            d_plus = _dist_ang(target_full, pol_plus)
-            log("probe_plus", ch+1, pol_plus, d_plus, dt_read)
+        logger = _CsvLogger(csv_path, target_full)
 
-            minus = stored[:]
-            minus[ch] = _iclamp(minus[ch] - step_now, min_code, max_code)
-            _set_one_code(piezo, ch+1, minus[ch], settle_s)
+    # read latencies only feed the timing prints and the CSV log; without
+    # either, the per-read clock calls are skipped
+    _now = time.perf_counter if (verbose_timing or logger) else _no_clock
 
+    try:
+        if logger or traj is not None:
             t0 = time.perf_counter()
-            pol_minus = pod.read_pol()
-            dt_read = (time.perf_counter() - t0) * 1e6
-            if verbose_timing:
-                print(f"    [TIMING] Read (-): {dt_read:.1f} us")
-            d_minus = _dist_ang(target_full, pol_minus)
-            log("probe_minus", ch+1, pol_minus, d_minus, dt_read)
-
-            _set_all_codes(piezo, stored, settle_s)
-
-            if d_plus < baseline_err:
-                stored[ch] = plus[ch]
-                _set_one_code(piezo, ch+1, stored[ch], settle_s)
-                t0 = time.perf_counter()
+            p0 = pod.read_pol()
+            dt_init = (time.perf_counter() - t0) * 1e6
+            d0 = dist_sq(target_ref, p0) ** 0.5
+            if logger:
+                logger.append("init", 0, p0, d0, 0, stored, read_latency_us=dt_init)
+            if traj is not None:
+                traj.append(p0, d0, 0, stored)
+
+        step_idx = 0
+        # the previous round's final eval read was taken at `stored`, so it is
+        # reused as the next baseline unless the codes changed since
+        baseline_dirty = True
+        # per-round scratch, allocated once and overwritten in place
+        probe = stored[:]
+        plus_codes, minus_codes = [0] * 4, [0] * 4
+        grad, trial = [0.0] * 4, [0] * 4
+        for rnd in range(1, max_rounds + 1):
+            round_t0 = time.perf_counter()
+            step_now = int(steps_codes[step_idx])
+            settle_now = settle_table[step_idx]
+            greedy_sq = (0.5 * thresh[step_idx]) ** 2 if greedy_accept else -1.0
+
+            if baseline_dirty:
+                t0 = _now()
                 baseline_pol = pod.read_pol()
-                dt_read = (time.perf_counter() - t0) * 1e6
+                dt_baseline = (_now() - t0) * 1e6
+                baseline_err_sq = dist_sq(target_ref, baseline_pol)
                 if verbose_timing:
-                    print(f"    [TIMING] Read (update+): {dt_read:.1f} us")
-                baseline_err = _dist_ang(target_full, baseline_pol)
-                log("accept_plus", ch+1, baseline_pol, baseline_err, dt_read)
-            elif d_minus < baseline_err:
-                stored[ch] = minus[ch]
-                _set_one_code(piezo, ch+1, stored[ch], settle_s)
-                t0 = time.perf_counter()
-                baseline_pol = pod.read_pol()
-                dt_read = (time.perf_counter() - t0) * 1e6
-                if verbose_timing:
-                    print(f"    [TIMING] Read (update-): {dt_read:.1f} us")
-                baseline_err = _dist_ang(target_full, baseline_pol)
-                log("accept_minus", ch+1, baseline_pol, baseline_err, dt_read)
-
-        dt_sweep = (time.perf_counter() - t0_sweep) * 1e6
-        if verbose_timing:
-            print(f"  [TIMING] Total 4-channel sweep: {dt_sweep:.1f} us")
-
-        _set_all_codes(piezo, stored, settle_s)
-        t0 = time.perf_counter()
-        pol_after = pod.read_pol()
-        dt_eval = (time.perf_counter() - t0) * 1e6
-        err_after = _dist_ang(target_full, pol_after)
-        if verbose_timing:
-            print(f"  [TIMING] Final eval read: {dt_eval:.1f} us")
-
-        dt_round = (time.perf_counter() - round_t0) * 1e6
-        print(
-            f"[round {rnd:03d}] step={step_now}"
-            f" | target=(DoP N/A, {target_full[1]:.3f}, {target_full[2]:.3f})"
-            f" | current=({pol_after[0]:.6f}, {pol_after[1]:.3f}, {pol_after[2]:.3f})"
-            f" | ang_err_deg={err_after:.6f}"
-            f" | codes={stored}"
-            f" | ROUND TIME: {dt_round:.0f} us"
-        )
-        log("round_eval", 0, pol_after, err_after, dt_eval)
-
-        if err_after < stop_threshold:
-            return {"converged": True,
-                    "final_distance_deg": err_after,
-                    "final_pol": pol_after,
-                    "final_codes": stored[:]}
-
-        if err_after < thresh[step_idx] and step_idx < len(steps_codes) - 1:
-            step_idx += 1
-
-    final_pol = pod.read_pol()
-    return {"converged": False,
-            "final_distance_deg": _dist_ang(target_full, final_pol),
-            "final_pol": final_pol,
-            "final_codes": stored[:]}
+                    print(f"  [TIMING] Baseline read: {dt_baseline:.1f} us")
+            else:
+                dt_baseline = float("nan")  # no read this round
+            log("baseline", 0, baseline_pol, baseline_err_sq, dt_baseline)
+
+            t0_sweep = _now()
+            # a channel's own code only changes on its own turn, so every
+            # candidate of the round can be clamped up front
+            _trial_codes(stored, step_now, min_code, max_code, plus_codes, minus_codes)
+            if method == "coordinate":
+                for ch in range(4):
+                    if verbose_timing:
+                        print(f"  [Ch {ch+1}]")
+
+                    plus_code = plus_codes[ch]
+                    minus_code = minus_codes[ch]
+
+                    # a probe clamped onto the channel's own code (range edge) would
+                    # only re-measure the baseline, so the baseline stands in for it
+                    probe[:] = stored
+                    minus_queued = False
+                    if plus_code == stored[ch]:
+                        pol_plus, d_plus_sq, dt_read = baseline_pol, baseline_err_sq, float("nan")
+                    else:
+                        probe[ch] = plus_code
+                        pol_plus, dt_read = _set_and_read(piezo, pod, probe, settle_now, _now)
+                        if minus_code != stored[ch]:
+                            # the -probe does not depend on this read: its frame goes
+                            # out now and settles while the +probe is scored and logged
+                            probe[ch] = minus_code
+                            piezo.send_piezo_codes(probe, flush=False)
+                            minus_queued = True
+                        if verbose_timing:
+                            print(f"    [TIMING] Read (+): {dt_read:.1f} us")
+                        d_plus_sq = dist_sq(target_ref, pol_plus)
+                    log("probe_plus", ch+1, pol_plus, d_plus_sq, dt_read)
+
+                    if minus_code == stored[ch]:
+                        pol_minus, d_minus_sq, dt_read = baseline_pol, baseline_err_sq, float("nan")
+                    else:
+                        if not minus_queued:
+                            probe[ch] = minus_code
+                            piezo.send_piezo_codes(probe, flush=False)
+                        pol_minus, dt_read = _settle_and_read(piezo, pod, settle_now, _now)
+                        if verbose_timing:
+                            print(f"    [TIMING] Read (-): {dt_read:.1f} us")
+                        d_minus_sq = dist_sq(target_ref, pol_minus)
+                    log("probe_minus", ch+1, pol_minus, d_minus_sq, dt_read)
+
+                    # only channel ch was perturbed, and it is still at minus_code: write it
+                    # once to its accepted code, or leave its restore to the next frame
+                    accept, new_code = _decide_next(stored[ch], step_now, min_code, max_code,
+                                                    d_plus_sq, d_minus_sq, baseline_err_sq)
+                    if accept == 1:
+                        stored[ch] = new_code
+                        baseline_pol, dt_read = _set_and_read(piezo, pod, stored, settle_now, _now)
+                        if verbose_timing:
+                            print(f"    [TIMING] Read (update+): {dt_read:.1f} us")
+                        baseline_err_sq = dist_sq(target_ref, baseline_pol)
+                        log("accept_plus", ch+1, baseline_pol, baseline_err_sq, dt_read)
+                    elif accept == -1:
+                        # the channel never left minus_code, so the probe read is the new baseline
+                        stored[ch] = new_code
+                        baseline_pol, baseline_err_sq = pol_minus, d_minus_sq
+                        log("accept_minus", ch+1, baseline_pol, baseline_err_sq, float("nan"))
+                    if accept and baseline_err_sq < greedy_sq:
+                        break  # good enough for this stage: straight to the eval read
+                    # otherwise ch goes back to stored[ch] in the next channel's +probe
+                    # frame (or the one before the eval read)
+            else:
+                # one +step probe per channel gives a one-sided finite-difference
+                # gradient; all 4 channels then move together against its sign,
+                # halving the step until the error improves. Channels clamped at
+                # the range edge get no read and no gradient.
+                chans = [ch for ch in range(4) if plus_codes[ch] != stored[ch]]
+                for ch in range(4):
+                    grad[ch] = 0.0
+                for i, ch in enumerate(chans):
+                    if i == 0:
+                        probe[:] = stored
+                        probe[ch] = plus_codes[ch]
+                        piezo.send_piezo_codes(probe, flush=False)
+                    pol_plus, dt_read = _settle_and_read(piezo, pod, settle_now, _now)
+                    if i + 1 < len(chans):
+                        # the next probe (which also restores this channel) does not
+                        # depend on this read, so it settles while this one is scored
+                        probe[:] = stored
+                        probe[chans[i + 1]] = plus_codes[chans[i + 1]]
+                        piezo.send_piezo_codes(probe, flush=False)
+                    if verbose_timing:
+                        print(f"  [Ch {ch+1}] [TIMING] Read (+): {dt_read:.1f} us")
+                    d_plus_sq = dist_sq(target_ref, pol_plus)
+                    log("probe_plus", ch+1, pol_plus, d_plus_sq, dt_read)
+                    grad[ch] = d_plus_sq - baseline_err_sq
+
+                alpha = step_now
+                for _ in range(max_backtracks + 1):
+                    _descent_codes(stored, grad, alpha, min_code, max_code, trial)
+                    if trial == stored:
+                        break
+                    pol_trial, dt_read = _set_and_read(piezo, pod, trial, settle_now, _now)
+                    if verbose_timing:
+                        print(f"  [TIMING] Read (step {alpha}): {dt_read:.1f} us")
+                    d_trial_sq = dist_sq(target_ref, pol_trial)
+                    if d_trial_sq < baseline_err_sq:
+                        stored[:] = trial
+                        baseline_pol, baseline_err_sq = pol_trial, d_trial_sq
+                        log("accept_step", 0, pol_trial, d_trial_sq, dt_read)
+                        break
+                    log("reject_step", 0, pol_trial, d_trial_sq, dt_read)
+                    alpha //= 2
+                    if alpha < 1:
+                        break
+
+            dt_sweep = (_now() - t0_sweep) * 1e6
+            if verbose_timing:
+                print(f"  [TIMING] Total 4-channel sweep: {dt_sweep:.1f} us")
+
+            # any channel the sweep left off its stored code (rejected probe or
+            # trial step) is restored in one frame
+            piezo.send_piezo_codes(stored, flush=False)
+            piezo.wait_settled(settle_now)
+            t0 = _now()
+            pol_after = pod.read_pol()
+            dt_eval = (_now() - t0) * 1e6
+            err_after = dist_sq(target_ref, pol_after) ** 0.5
+            if verbose_timing:
+                print(f"  [TIMING] Final eval read: {dt_eval:.1f} us")
+
+            dt_round = (time.perf_counter() - round_t0) * 1e6
+            print(
+                f"[round {rnd:03d}] step={step_now}"
+                f" | target=(DoP N/A, {target_full[1]:.3f}, {target_full[2]:.3f})"
+                f" | current=({pol_after[0]:.6f}, {pol_after[1]:.3f}, {pol_after[2]:.3f})"
+                f" | ang_err_deg={err_after:.6f}"
+                f" | codes={stored}"
+                f" | ROUND TIME: {dt_round:.0f} us"
+            )
+            log("round_eval", 0, pol_after, err_after * err_after, dt_eval)
+            baseline_pol, baseline_err_sq = pol_after, err_after * err_after
+            baseline_dirty = False
+
+            if err_after < stop_threshold:
+                return done({"converged": True,
+                             "final_distance_deg": err_after,
+                             "final_pol": pol_after,
+                             "final_codes": stored[:]})
+
+            if err_after < thresh[step_idx] and step_idx < len(steps_codes) - 1:
+                step_idx += 1
+
+        final_pol = pod.read_pol()
+        return done({"converged": False,
+                     "final_distance_deg": dist_sq(target_ref, final_pol) ** 0.5,
+                     "final_pol": final_pol,
+                     "final_codes": stored[:]})
+    finally:
+        if logger:
+            logger.close()
+
+# the only columns the plot needs; float32 halves their memory
+_PLOT_DTYPES = {"target_psi": "float32", "target_chi": "float32",
+                "curr_psi": "float32", "curr_chi": "float32"}
+
+def _read_plot_columns(csv_path: str) -> pd.DataFrame:
+    usecols = ["time", *_PLOT_DTYPES]
+    try:
+        return pd.read_csv(csv_path, engine="pyarrow", usecols=usecols, dtype=_PLOT_DTYPES)
+    except ImportError:  # pyarrow is optional
+        return pd.read_csv(csv_path, usecols=usecols, dtype=_PLOT_DTYPES)
 
 def plot_time_vs_polarization(csv_path: str,
     *,
@@ -234,20 +611,27 @@ def plot_time_vs_polarization(csv_path: str,
     show: bool = True
 ) -> Dict[str, Tuple[plt.Figure, plt.Axes]]:
 
-    df = pd.read_csv(csv_path)
-    df["_t"] = pd.to_datetime(df["time"], errors="coerce")
-    df = df.dropna(subset=["_t"]).reset_index(drop=True)
-    x_sec = (df["_t"] - df["_t"].iloc[0]).dt.total_seconds()
+    df = _read_plot_columns(csv_path)
+    if pd.api.types.is_numeric_dtype(df["time"]):
+        df = df.dropna(subset=["time"]).reset_index(drop=True)
+        t = df["time"].to_numpy()
+        x_sec = t - t[0]
+    else:  # logs written before "time" became Unix seconds hold ISO timestamps
+        df["_t"] = pd.to_datetime(df["time"], errors="coerce")
+        df = df.dropna(subset=["_t"]).reset_index(drop=True)
+        x_sec = (df["_t"] - df["_t"].iloc[0]).dt.total_seconds()
 
     target_azimuth = float(df["target_psi"].iloc[0])
     target_ellipticity = float(df["target_chi"].iloc[0])
-    curr_azimuth = df["curr_psi"].copy()
-    curr_ellipticity = df["curr_chi"].copy()
+    curr_azimuth = df["curr_psi"]
+    curr_ellipticity = df["curr_chi"]
 
     def wrap_to_near(series, ref):
-        d = (series - ref) % 180
-        d[d > 90] -= 180
-        return ref + d
+        # ref + ((x - ref + 90) % 180) - 90, with one temporary modified in place
+        d = series.to_numpy() - (ref - 90.0)
+        d %= 180.0
+        d += ref - 90.0
+        return d
 
     curr_azimuth = wrap_to_near(curr_azimuth, target_azimuth)
     curr_ellipticity = wrap_to_near(curr_ellipticity, target_ellipticity)
@@ -256,8 +640,8 @@ def plot_time_vs_polarization(csv_path: str,
         Path(save_dir).mkdir(parents=True, exist_ok=True)
 
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(x_sec, [target_azimuth]*len(x_sec), linestyle="--", linewidth=1.0, label="Target Azimuth (deg)")
-    ax.plot(x_sec, [target_ellipticity]*len(x_sec), linestyle="--", linewidth=1.0, label="Target Ellipticity (deg)")
+    ax.axhline(target_azimuth, color="C0", linestyle="--", linewidth=1.0, label="Target Azimuth (deg)")
+    ax.axhline(target_ellipticity, color="C1", linestyle="--", linewidth=1.0, label="Target Ellipticity (deg)")
     ax.plot(x_sec, curr_azimuth, linewidth=1.5, label="Current Azimuth (deg)")
     ax.plot(x_sec, curr_ellipticity, linewidth=1.5, label="Current Ellipticity (deg)")
 
@@ -0,0 +1,204 @@
+"""Hardware daemon that keeps POD2000 and AP2XXX connections open across MCP restarts.
+
+The stdio MCP servers are recycled by their host, and every restart would pay
+the USB / TCP open again. With OPTICS_HW_DAEMON=1 they instead talk to this
+process, which owns the device handles and outlives them. The protocol is one
+JSON object per line over a Unix socket:
+
+    -> {"dev": "pod", "op": "read_pol", "args": [], "kwargs": {}}
+    <- {"ok": true, "result": [0.99, 12.3, -4.5]}
+
+A method returning a driver object (e.g. AP2XXX.OSA()) is kept in the daemon
+and answered with {"handle": name}, which the client wraps in another HwClient.
+The daemon is spawned on first use and runs until killed.
+
+    python hw_daemon.py [socket_path]
+"""
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict
+
+SOCK_PATH = os.getenv("OPTICS_HW_SOCK", "/tmp/optics_hw.sock")
+
+
+def enabled() -> bool:
+    return os.getenv("OPTICS_HW_DAEMON", "0") == "1"
+
+
+# ============================================================================
+# Daemon side
+# ============================================================================
+def _open_pod(*args, **kwargs):
+    from POD2000 import POD2000
+    pod = POD2000(*args, **kwargs)
+    pod.open()
+    return pod
+
+
+def _open_ap2xxx(*args, **kwargs):
+    import PyApex.AP2XXX as AP2XXX
+    return AP2XXX(*args, **kwargs)
+
+
+_FACTORIES = {"pod": _open_pod, "ap2xxx": _open_ap2xxx}
+_PLAIN = (type(None), bool, int, float, str, list, tuple, dict)
+
+
+def _encode(o):
+    # numpy arrays and scalars from the drivers
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    if isinstance(o, (bytes, bytearray)):
+        return o.decode("latin-1")
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+class _Devices:
+    def __init__(self):
+        self.handles: Dict[str, Any] = {}
+        self.locks: Dict[str, threading.Lock] = {}  # one per physical device
+        self._guard = threading.Lock()
+
+    def _lock(self, dev: str) -> threading.Lock:
+        root = dev.split(".", 1)[0]
+        with self._guard:
+            return self.locks.setdefault(root, threading.Lock())
+
+    def call(self, dev: str, op: str, args: list, kwargs: dict):
+        with self._lock(dev):
+            if op == "__open__":
+                if dev not in self.handles:
+                    self.handles[dev] = _FACTORIES[dev](*args, **kwargs)
+                return None
+            if dev not in self.handles:
+                raise RuntimeError(f"{dev} is not open")
+            result = getattr(self.handles[dev], op)(*args, **kwargs)
+            if op in ("close", "Close"):
+                # drop the device and every sub-instrument handed out from it
+                for name in [n for n in self.handles if n == dev or n.startswith(dev + ".")]:
+                    del self.handles[name]
+            elif not isinstance(result, _PLAIN) and not hasattr(result, "tolist"):
+                name = f"{dev}.{op}"
+                self.handles[name] = result
+                return {"__handle__": name}
+            return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                result = self.server.devices.call(req["dev"], req["op"],
+                                                  req.get("args", []), req.get("kwargs", {}))
+                if isinstance(result, dict) and "__handle__" in result:
+                    reply = {"ok": True, "handle": result["__handle__"]}
+                else:
+                    reply = {"ok": True, "result": result}
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply, default=_encode).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str = SOCK_PATH):
+    if os.path.exists(path):
+        os.unlink(path)
+    with _Server(path, _Handler) as server:
+        server.devices = _Devices()
+        os.chmod(path, 0o600)
+        server.serve_forever()
+
+
+# ============================================================================
+# Client side
+# ============================================================================
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def _connect(path: str, timeout_s: float = 10.0):
+    """Connect to the daemon, spawning it if nothing is listening yet"""
+    spawned = False
+    deadline = time.monotonic() + timeout_s
+    while True:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(path)
+            return s
+        except (FileNotFoundError, ConnectionRefusedError):
+            s.close()
+            if not spawned:
+                subprocess.Popen([sys.executable, os.path.abspath(__file__), path],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)),
+                                 stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL, start_new_session=True)
+                spawned = True
+            if time.monotonic() > deadline:
+                raise ConnectionError(f"hardware daemon did not come up on {path}")
+            time.sleep(0.05)
+
+
+def _rpc(dev: str, op: str, args=(), kwargs=None):
+    global _conn
+    frame = json.dumps({"dev": dev, "op": op, "args": list(args), "kwargs": kwargs or {}},
+                       default=_encode).encode() + b"\n"
+    with _conn_lock:
+        if _conn is None:
+            _conn = _connect(SOCK_PATH).makefile("rwb")
+        try:
+            _conn.write(frame)
+            _conn.flush()
+            line = _conn.readline()
+        except OSError:
+            _conn = None
+            raise
+        if not line:
+            _conn = None
+            raise ConnectionError("hardware daemon closed the connection")
+    reply = json.loads(line)
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    if "handle" in reply:
+        return HwClient(reply["handle"])
+    return reply["result"]
+
+
+class HwClient:
+    """
+    Proxy for a device held by the daemon: attribute access returns a function
+    that runs the method of the same name there. Results come back as JSON
+    types, so tuples arrive as lists and numpy arrays as lists.
+    """
+
+    def __init__(self, dev: str):
+        self._dev = dev
+
+    @classmethod
+    def open(cls, dev: str, *args, **kwargs) -> "HwClient":
+        """Open `dev` in the daemon (no-op if it is already open there)"""
+        _rpc(dev, "__open__", args, kwargs)
+        return cls(dev)
+
+    def __getattr__(self, op: str):
+        if op.startswith("_"):
+            raise AttributeError(op)
+
+        def call(*args, **kwargs):
+            return _rpc(self._dev, op, args, kwargs)
+        call.__name__ = op
+        return call
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1] if len(sys.argv) > 1 else SOCK_PATH)
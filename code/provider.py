@@ -0,0 +1,245 @@
+"""LLM provider adapters for client.MCPClient.
+
+A provider streams one model turn, reports text deltas and finished tool calls
+through callbacks as they arrive, and returns a normalized Completion. The agent
+loop itself (tool dispatch, caching, logging) is provider independent.
+"""
+import dataclasses
+import os
+from importlib.util import find_spec
+from typing import Callable, Dict, List, Optional, Protocol
+
+import httpx
+
+try:
+    from orjson import loads as _loads
+except ImportError:  # orjson is optional
+    from json import loads as _loads
+
+
+@dataclasses.dataclass(slots=True)
+class ToolCall:
+    id: str
+    name: str
+    arguments: dict
+    raw_arguments: str = ""
+
+
+@dataclasses.dataclass(slots=True)
+class Completion:
+    text_chunks: List[str]
+    tool_calls: List[ToolCall]
+    usage: Dict[str, int]
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Completion":
+        # rebuilds a completion stored by LLMCache's Redis backend
+        return cls(list(d["text_chunks"]), [ToolCall(**tc) for tc in d["tool_calls"]], dict(d["usage"]))
+
+
+OnText = Callable[[str], None]
+OnToolCall = Callable[[ToolCall], None]
+
+
+class LLMProvider(Protocol):
+    name: str
+
+    def tool_schema(self, tools: list) -> list:
+        """MCP tools -> the provider's tool definitions"""
+
+    async def complete(self, model: str, messages: list, tools: list, *,
+                       on_text: OnText, on_tool_call: OnToolCall) -> Completion:
+        """Stream one model turn"""
+
+    def turn_messages(self, completion: Completion, results: List[str]) -> list:
+        """History messages recording this turn: the assistant reply and the tool results"""
+
+    async def aclose(self) -> None:
+        """Release the HTTP client"""
+
+
+def _http_client() -> httpx.AsyncClient:
+    # one pooled client for every SDK call; HTTP/2 when the h2 package is available
+    return httpx.AsyncClient(
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
+
+def _with_cache_breakpoint(items: list) -> list:
+    """
+    Copy of `items` whose last entry carries an Anthropic cache_control
+    breakpoint, so the prompt prefix up to it is served from the KV cache on
+    the next turn. Only the newest message and the tool list are marked,
+    which stays within the API's limit of four breakpoints per request.
+    """
+    if not items:
+        return items
+    last = dict(items[-1])
+    if "content" in last:
+        content = last["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        if not content:
+            return items
+        content = list(content)
+        content[-1] = {**content[-1], "cache_control": {"type": "ephemeral"}}
+        last["content"] = content
+    else:
+        last["cache_control"] = {"type": "ephemeral"}
+    return items[:-1] + [last]
+
+
+def _parse_args(raw: Optional[str]) -> dict:
+    try:
+        return _loads(raw) if raw and raw.strip() else {}
+    except ValueError:
+        return {}
+
+
+class AnthropicProvider:
+    name = "Anthropic"
+
+    def __init__(self, max_tokens: int = 1000):
+        from anthropic import AsyncAnthropic
+        self._http = _http_client()
+        self.client = AsyncAnthropic(http_client=self._http)
+        self.max_tokens = max_tokens
+
+    def tool_schema(self, tools):
+        return [{
+            "name": tool.name,
+            "description": tool.description,
+            "input_schema": tool.inputSchema
+        } for tool in tools]
+
+    async def complete(self, model, messages, tools, *, on_text, on_tool_call):
+        async with self.client.messages.stream(
+            model=model,
+            max_tokens=self.max_tokens,
+            messages=_with_cache_breakpoint(messages),
+            tools=_with_cache_breakpoint(tools)
+        ) as stream:
+            async for event in stream:
+                if event.type == "text":
+                    on_text(event.text)
+                elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                    # the block is complete, so the tool can start before the turn ends
+                    block = event.content_block
+                    on_tool_call(ToolCall(block.id, block.name, block.input))
+            message = await stream.get_final_message()
+
+        text_chunks = [c.text for c in message.content if c.type == "text" and c.text]
+        tool_calls = [ToolCall(c.id, c.name, c.input) for c in message.content if c.type == "tool_use"]
+        u = message.usage
+        usage = {"prompt_tokens": u.input_tokens, "completion_tokens": u.output_tokens,
+                 "total_tokens": u.input_tokens + u.output_tokens}
+        return Completion(text_chunks, tool_calls, usage)
+
+    def turn_messages(self, completion, results):
+        content = [{"type": "text", "text": t} for t in completion.text_chunks]
+        content += [{"type": "tool_use", "id": c.id, "name": c.name, "input": c.arguments}
+                    for c in completion.tool_calls]
+        return [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": c.id, "content": r}
+                for c, r in zip(completion.tool_calls, results)
+            ]},
+        ]
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class OpenAIProvider:
+    name = "OpenAI"
+
+    def __init__(self, parallel_tool_calls: bool = True, **client_kwargs):
+        from openai import AsyncOpenAI
+        self._http = _http_client()
+        self.client = AsyncOpenAI(http_client=self._http, **client_kwargs)
+        self.parallel_tool_calls = parallel_tool_calls
+
+    def tool_schema(self, tools):
+        # sorted so the prompt prefix is byte-identical between sessions (automatic prompt caching)
+        tools = sorted(tools, key=lambda t: t.name)
+        return [{"type": "function", "function": {
+            "name": t.name,
+            "description": t.description,
+            "parameters": t.inputSchema,
+        }} for t in tools]
+
+    async def complete(self, model, messages, tools, *, on_text, on_tool_call):
+        kwargs = dict(model=model, messages=messages, tools=tools, tool_choice="auto",
+                      stream=True, stream_options={"include_usage": True})
+        if self.parallel_tool_calls:
+            kwargs["parallel_tool_calls"] = True
+
+        text = []
+        calls = {}  # index -> [id, name, arguments]
+        done = {}   # index -> ToolCall
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        def finish(index):
+            call_id, name, raw_args = calls[index]
+            done[index] = ToolCall(call_id, name, _parse_args(raw_args), raw_args)
+            on_tool_call(done[index])
+
+        stream = await self.client.chat.completions.create(**kwargs)
+        async for chunk in stream:
+            if chunk.usage:
+                usage = {"prompt_tokens": chunk.usage.prompt_tokens,
+                         "completion_tokens": chunk.usage.completion_tokens,
+                         "total_tokens": chunk.usage.total_tokens}
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                text.append(delta.content)
+                on_text(delta.content)
+            for d in delta.tool_calls or ():
+                if d.index not in calls:
+                    # a new call starts, so the arguments of the earlier ones are complete
+                    for index in calls:
+                        if index not in done:
+                            finish(index)
+                    calls[d.index] = [d.id, "", ""]
+                if d.function is not None:
+                    calls[d.index][1] += d.function.name or ""
+                    calls[d.index][2] += d.function.arguments or ""
+        for index in calls:
+            if index not in done:
+                finish(index)
+
+        return Completion(["".join(text)] if text else [], [done[i] for i in sorted(done)], usage)
+
+    def turn_messages(self, completion, results):
+        assistant = {
+            "role": "assistant",
+            "content": "".join(completion.text_chunks),
+            "tool_calls": [{
+                "id": c.id,
+                "type": "function",
+                "function": {"name": c.name, "arguments": c.raw_arguments},
+            } for c in completion.tool_calls],
+        }
+        return [assistant] + [
+            {"role": "tool", "tool_call_id": c.id, "content": r}
+            for c, r in zip(completion.tool_calls, results)
+        ]
+
+    async def aclose(self):
+        await self._http.aclose()
+
+
+class DeepSeekProvider(OpenAIProvider):
+    name = "DeepSeek"
+
+    def __init__(self):
+        super().__init__(
+            parallel_tool_calls=False,
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+        )
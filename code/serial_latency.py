@@ -0,0 +1,32 @@
+"""Low-latency setup for the USB-serial ports of the Arduino and ARoF devices."""
+import os
+import sys
+
+
+def set_ftdi_latency_timer(port: str, latency_ms: int = 1) -> bool:
+    """
+    Lower the FTDI latency timer (default 16 ms) for a /dev/ttyUSBx port on Linux.
+    Returns True if the timer was written; silently skips other platforms/ports.
+    """
+    if not sys.platform.startswith("linux") or not port:
+        return False
+    path = f"/sys/bus/usb-serial/devices/{os.path.basename(port)}/latency_timer"
+    try:
+        with open(path, "w") as f:
+            f.write(str(int(latency_ms)))
+        return True
+    except OSError:
+        return False
+
+
+def set_low_latency(sr) -> bool:
+    """
+    Put a pyserial port into low-latency mode (ASYNC_LOW_LATENCY ioctl),
+    falling back to the FTDI latency_timer in sysfs. Best effort only:
+    without it every request waits out the default 16 ms latency timer.
+    """
+    try:
+        sr.set_low_latency_mode(True)
+        return True
+    except (AttributeError, NotImplementedError, ValueError, OSError):
+        return set_ftdi_latency_timer(sr.port)
@@ -1,7 +1,6 @@
 from typing import Any, Optional, Dict, Union, Literal
 import logging, sys, re, asyncio, os, subprocess
 from mcp.server.fastmcp import FastMCP
-from matplotlib import pyplot as plt
 from pathlib import Path
 import pandas as pd
 from arduino_ctrl import ArduinoController
@@ -11,6 +10,10 @@ logger = logging.getLogger(__name__)
 pod_instance = None
 arduino_instance = None
 
+# Serial I/O runs on worker threads so the event loop keeps serving requests;
+# the lock keeps commands to the board one at a time
+arduino_lock = asyncio.Lock()
+
 # Initialize FastMCP server
 mcp = FastMCP("opticsMCP")
 
@@ -37,8 +40,9 @@ async def piezo_reset() -> str:
       Confirmation message
     """
     try:
-        arduino = get_arduino()
-        arduino.piezo.reset_piezo()
+        async with arduino_lock:
+            arduino = await asyncio.to_thread(get_arduino)
+            await asyncio.to_thread(arduino.piezo.reset_piezo)
         return "Piezo DAC reset completed successfully"
     except Exception as e:
         return f"Error resetting piezo DAC: {str(e)}"
@@ -59,8 +63,9 @@ async def piezo_set_code(channel: int, code: int) -> str:
       Confirmation with channel number and actual code written (after clamping)
     """
     try:
-        arduino = get_arduino()
-        actual_code = arduino.piezo.send_piezo_code(channel, code)
+        async with arduino_lock:
+            arduino = await asyncio.to_thread(get_arduino)
+            actual_code = await asyncio.to_thread(arduino.piezo.send_piezo_code, channel, code)
         return f"Channel {channel} set to code {actual_code}"
     except Exception as e:
         return f"Error setting piezo code: {str(e)}"
@@ -81,8 +86,9 @@ async def piezo_set_voltage(channel: int, voltage: float) -> str:
       Confirmation with channel, actual voltage set, and corresponding DAC code
     """
     try:
-        arduino = get_arduino()
-        code = arduino.piezo.send_piezo_voltage(channel, voltage)
+        async with arduino_lock:
+            arduino = await asyncio.to_thread(get_arduino)
+            code = await asyncio.to_thread(arduino.piezo.send_piezo_voltage, channel, voltage)
         actual_voltage = (code / 4095) * arduino.piezo.vref
         return f"Channel {channel} set to {actual_voltage:.4f}V (code {code})"
     except Exception as e:
@@ -108,8 +114,9 @@ async def ttl_read_active_beam() -> str:
       "Active beam: Beam 1" or "Active beam: Beam 2"
     """
     try:
-        arduino = get_arduino()
-        beam_number = arduino.ttl.read_active_beam()
+        async with arduino_lock:
+            arduino = await asyncio.to_thread(get_arduino)
+            beam_number = await asyncio.to_thread(arduino.ttl.read_active_beam)
         return f"Active beam: Beam {beam_number}"
     except Exception as e:
         return f"Error reading TTL signal: {str(e)}"
@@ -132,12 +139,13 @@ async def arduino_close() -> str:
     """
     global arduino_instance
     try:
-        if arduino_instance is not None:
-            arduino_instance.close()
-            arduino_instance = None
-            return "Successfully closed Arduino connection"
-        else:
-            return "Arduino connection already closed"
+        async with arduino_lock:
+            if arduino_instance is not None:
+                await asyncio.to_thread(arduino_instance.close)
+                arduino_instance = None
+                return "Successfully closed Arduino connection"
+            else:
+                return "Arduino connection already closed"
     except Exception as e:
         return f"Error closing Arduino connection: {str(e)}"
 
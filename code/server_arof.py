@@ -3,7 +3,6 @@ from typing import Any, Optional, Dict, Union, Literal
 from mcp.server.fastmcp import FastMCP
 # from mcp.types import TableContent
 import logging, sys, re, asyncio
-from matplotlib import pyplot as plt
 import subprocess
 import pandas as pd
 from pathlib import Path
@@ -13,6 +12,12 @@ from ARoF_transceiver import *
 logger = logging.getLogger(__name__)
 
 arof_address = "YOUR_ADDR"
+arof_instance = None
+
+# Serial I/O runs on worker threads so the event loop keeps serving requests
+# (set_bias_vol alone blocks for several seconds); the lock keeps commands to
+# the device one at a time
+arof_lock = asyncio.Lock()
 
 # Initialize FastMCP server
 mcp = FastMCP("opticsMCP")
@@ -26,6 +31,13 @@ def nm_to_ghz(l_nm: float) -> float:
 def ghz_to_nm(f_ghz: float) -> float:
 	return C_M_PER_S / (f_ghz * 1e9) * 1e9
 
+def get_arof():
+	"""Get or create the ARoF transceiver instance (kept open across tool calls)"""
+	global arof_instance
+	if arof_instance is None:
+		arof_instance = ARoF_transceiver(arof_address)
+	return arof_instance
+
 # ============================================================================
 # ARoF Tools
 # ============================================================================
@@ -37,9 +49,9 @@ async def arof_tx_read_info() -> str:
 	Returns:
 	  Raw multi-line string from the device.
 	"""
-	tx = ARoF_transceiver(arof_address)
-	s = tx.readInfo()
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		s = await asyncio.to_thread(tx.readInfo)
 	return s
 
 @mcp.tool()
@@ -50,9 +62,9 @@ async def arof_tx_read_output_power() -> str:
 	Returns:
 	  "output_power=<value> dBm"
 	"""
-	tx = ARoF_transceiver(arof_address)
-	val = tx.readOutputPower()  # float dBm
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		val = await asyncio.to_thread(tx.readOutputPower)  # float dBm
 	return f"output_power={val} dBm"
 
 
@@ -64,9 +76,9 @@ async def arof_tx_get_bias_voltage() -> str:
 	Returns:
 	  "bias_voltage=<value> V"
 	"""
-	tx = ARoF_transceiver(arof_address)
-	val = tx.read_bias_vol()  # float V
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		val = await asyncio.to_thread(tx.read_bias_vol)  # float V
 	return f"bias_voltage={val} V"
 
 @mcp.tool()
@@ -77,9 +89,9 @@ async def arof_tx_get_bias_current() -> str:
 	Returns:
 	  "bias_current=<value> mA"
 	"""
-	tx = ARoF_transceiver(arof_address)
-	val = tx.read_bias_cur()  # int mA
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		val = await asyncio.to_thread(tx.read_bias_cur)  # int mA
 	return f"bias_current={val} mA"
 
 
@@ -94,9 +106,9 @@ async def arof_tx_set_bias_voltage(bias_v: float) -> str:
 	Returns:
 	  "bias_voltage=<value> V"
 	"""
-	tx = ARoF_transceiver(arof_address)
-	applied = tx.set_bias_vol(bias_v)  # float V (parsed from ack)
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		applied = await asyncio.to_thread(tx.set_bias_vol, bias_v)  # float V (parsed from ack)
 	return f"bias_voltage={applied} V"
 
 @mcp.tool()
@@ -110,11 +122,32 @@ async def arof_tx_set_bias_current(bias_mA: int) -> str:
 	Returns:
 	  "bias_current=<value> mA"
 	"""
-	tx = ARoF_transceiver(arof_address)
-	applied = tx.set_bias_cur(bias_mA)  # int mA (parsed from ack)
-	tx.arof.close()
+	async with arof_lock:
+		tx = await asyncio.to_thread(get_arof)
+		applied = await asyncio.to_thread(tx.set_bias_cur, bias_mA)  # int mA (parsed from ack)
 	return f"bias_current={applied} mA"
 
+@mcp.tool()
+async def arof_close() -> str:
+	"""
+	Close the ARoF transceiver serial connection.
+
+	Returns:
+	  Status message.
+	"""
+	global arof_instance
+	try:
+		async with arof_lock:
+			if arof_instance is not None:
+				await asyncio.to_thread(arof_instance.stop_reader)
+				await asyncio.to_thread(arof_instance.arof.close)
+				arof_instance = None
+				return "Successfully closed ARoF connection"
+			else:
+				return "ARoF connection already closed"
+	except Exception as e:
+		return f"Error closing ARoF connection: {str(e)}"
+
 ######################## main ########################
 if __name__ == "__main__":
 	# Initialize and run the server
@@ -2,29 +2,574 @@
 from typing import Any, Optional, Dict, Union, Literal
 from mcp.server.fastmcp import FastMCP
 # from mcp.types import TableContent
-import logging, sys, re, asyncio
-from matplotlib import pyplot as plt
+import logging, logging.handlers, sys, re, asyncio, socket
 import subprocess
 import pandas as pd
 from pathlib import Path
-import os, sys
+import os, sys, atexit, functools, base64, queue, threading, contextlib, inspect
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import PyApex.AP2XXX as AP2XXX
+from PyApex.Common import Send, Receive
+from PyApex.Errors import ApexError
+from PyApex.Constantes import (APXXXX_ERROR_ARGUMENT_TYPE, APXXXX_ERROR_ARGUMENT_VALUE,
+                               AP2XXX_MINNPTS, AP2XXX_MAXNPTS)
+import hw_daemon
+from cache import ttl_cache
 
 logger = logging.getLogger(__name__)
+logger.setLevel(os.getenv("OSA_LOG_LEVEL", "WARNING"))
+# records are buffered and written to stderr (stdout carries the MCP stream)
+# in batches, or at once from ERROR up
+_log_stream = logging.StreamHandler(sys.stderr)
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+logger.addHandler(logging.handlers.MemoryHandler(capacity=1024, flushLevel=logging.ERROR, target=_log_stream))
 
 osa_ipaddress = "YOUR_IP"
+# AP2XXX sessions kept open across tool calls. With OSA_POOL_SIZE > 1 that
+# many tools run at once, each on its own TCP session; how much the
+# instrument overlaps them is up to its SCPI server.
+OSA_POOL_SIZE = max(1, int(os.getenv("OSA_POOL_SIZE", "1")))
+osa_lock = asyncio.Semaphore(OSA_POOL_SIZE)  # one tool per session
+
+# Last value set through these tools, field -> (requested, applied as read back).
+# A set that repeats the requested value is answered from here without a round trip.
+# Changes made on the front panel are not seen; osa_cache_clear forces revalidation.
+_osa_state: Dict[str, tuple] = {}
+_OSA_TOL = 1e-9
+
+# With OSA_DEBOUNCE_MS > 0 the window/npoints setters are queued and sent
+# together, in one send, before the next other OSA tool runs or after that
+# many ms. Off by default: the setters then apply and verify immediately.
+OSA_DEBOUNCE_MS = float(os.getenv("OSA_DEBOUNCE_MS", "0"))
+
+# With OSA_SET_READBACK=0 the setters only write. The value is read back in
+# the background within OSA_RECONCILE_S (one round trip for everything set
+# since), or on demand with osa_verify.
+OSA_SET_READBACK = os.getenv("OSA_SET_READBACK", "1") == "1"
+OSA_RECONCILE_S = 1.0
+_osa_unverified: Dict[str, tuple] = {}     # field -> (getter, cast) awaiting read back
+_osa_last_readback: Dict[str, float] = {}  # field -> value the OSA last reported
+_osa_reconcile_task: Optional[asyncio.Task] = None
+
+async def _prewarm():
+	"""Open an OSA session while the server starts, so the first tool call does not wait for it"""
+	def open_session():
+		with _osa_session() as session:
+			session.osa
+	try:
+		async with osa_lock:
+			await asyncio.to_thread(open_session)
+	except Exception:
+		logger.exception("OSA prewarm failed; it connects on the first tool call instead")
+
+@contextlib.asynccontextmanager
+async def lifespan(server):
+	task = asyncio.create_task(_prewarm())
+	try:
+		yield
+	finally:
+		task.cancel()
 
 # Initialize FastMCP server
-mcp = FastMCP("opticsMCP")
+mcp = FastMCP("opticsMCP", lifespan=lifespan)
+
+def osa_tool(fn=None, *, deferred=False, hold_session=True):
+	"""
+	Register a blocking OSA tool. Its body runs on a worker thread so the
+	event loop keeps serving other requests, one tool per pooled session, and
+	gets that session's OSA sub-instrument as its first argument (hidden from
+	the tool schema). Queued settings are sent first, except for `deferred`
+	(queueing) setters. With hold_session=False the body only touches local
+	state (caches, the pool itself): it gets no session or OSA argument, so
+	no connection is opened for it.
+	"""
+	if fn is None:
+		return functools.partial(osa_tool, deferred=deferred, hold_session=hold_session)
+
+	def run(*args, **kwargs):
+		_osa_local.note = None  # set by _osa_set_cached if the value is not confirmed yet
+		if not hold_session:
+			return fn(*args, **kwargs), None
+		with _osa_session() as session:
+			if not deferred:
+				osa_batcher.flush()
+			return fn(session.osa, *args, **kwargs), _osa_local.note
+
+	@functools.wraps(fn)
+	async def wrapper(*args, **kwargs):
+		async with osa_lock:
+			try:
+				result, note = await asyncio.to_thread(run, *args, **kwargs)
+			except Exception:
+				_osa_state.clear()  # the instrument may be in any state now
+				_osa_settings.cache_clear()
+				osa_batcher.pending.clear()
+				_osa_unverified.clear()
+				raise
+		if osa_batcher.pending:
+			osa_batcher.schedule()
+		if _osa_unverified:
+			_schedule_reconcile()
+		if note and isinstance(result, str):
+			result += f" ({note})"
+		return result
+
+	if hold_session:
+		sig = inspect.signature(fn)
+		wrapper.__signature__ = sig.replace(parameters=list(sig.parameters.values())[1:])
+		wrapper.__annotations__ = {k: v for k, v in fn.__annotations__.items() if k != "osa"}
+	return mcp.tool()(wrapper)
 
 # Helper function
 C_M_PER_S = 299_792_458.0  # exact, m/s
 
+# c / (x * 1e-9) / 1e9 folds to c / x for nm -> GHz and GHz -> nm alike.
+# Setpoints repeat from call to call, so the scalar forms are memoized.
+@functools.lru_cache(maxsize=1024)
 def nm_to_ghz(l_nm: float) -> float:
-	return C_M_PER_S / (l_nm * 1e-9) / 1e9
+	return C_M_PER_S / l_nm
 
+@functools.lru_cache(maxsize=1024)
 def ghz_to_nm(f_ghz: float) -> float:
-	return C_M_PER_S / (f_ghz * 1e9) * 1e9
+	return C_M_PER_S / f_ghz
+
+def _tune_socket(sock):
+	"""
+	Send small SCPI writes at once (no Nagle delay) and probe idle sessions,
+	so a peer that went away is noticed within about a minute, not on the
+	next tool call's timeout.
+	"""
+	sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+	if hasattr(socket, "TCP_KEEPIDLE"):  # Linux
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+	elif hasattr(socket, "SIO_KEEPALIVE_VALS"):  # Windows: on, idle ms, interval ms
+		sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, 30000, 10000))
+
+def _socket_alive(ap) -> bool:
+	sock = getattr(ap, "Connexion", None)
+	if not isinstance(sock, socket.socket):
+		return True  # hardware daemon proxy; the daemon owns the socket
+	return sock.fileno() != -1
+
+class _OsaSession:
+	"""One AP2XXX connection and its OSA() sub-instrument, created on first use"""
+
+	def __init__(self, ap):
+		self.ap = ap
+		self._osa = None
+
+	@property
+	def osa(self):
+		if self._osa is None:
+			self._osa = self.ap.OSA()
+		return self._osa
+
+
+class Ap2Pool:
+	"""
+	Up to `size` AP2XXX sessions, opened on demand and handed out one caller
+	at a time. If the instrument refuses another session while one is open,
+	the pool stays at the sessions it has. Through the hardware daemon there
+	is only its one connection.
+	"""
+
+	def __init__(self, size: int):
+		self.size = 1 if hw_daemon.enabled() else size
+		self._idle: "queue.LifoQueue[_OsaSession]" = queue.LifoQueue()
+		self._all: list = []
+		self._guard = threading.Lock()
+
+	def _open(self):
+		if hw_daemon.enabled():
+			return hw_daemon.HwClient.open("ap2xxx", osa_ipaddress, Simulation=False)
+		ap = AP2XXX(osa_ipaddress, Simulation=False)
+		_tune_socket(ap.Connexion)
+		return ap
+
+	def _grow(self) -> Optional[_OsaSession]:
+		with self._guard:
+			if len(self._all) >= self.size:
+				return None
+			ap = self._open()
+			if not ap.IsConnected():
+				# AP2XXX.Open() only prints "Cannot connect" and leaves an unconnected socket
+				ap.Close()
+				if not self._all:
+					raise ConnectionError(f"Cannot connect to the OSA at {osa_ipaddress}")
+				logger.info("OSA refused session %d, staying at %d", len(self._all) + 1, len(self._all))
+				self.size = len(self._all)
+				return None
+			logger.debug("connected")
+			session = _OsaSession(ap)
+			self._all.append(session)
+			return session
+
+	def acquire(self) -> _OsaSession:
+		while True:
+			try:
+				session = self._idle.get_nowait()
+			except queue.Empty:
+				session = self._grow() or self._idle.get()
+			if session is not None:  # None marks a slot freed by a dropped session
+				return session
+
+	def release(self, session: _OsaSession, broken: bool = False):
+		"""
+		Return `session` to the pool. A `broken` session (its tool body hit a
+		connection error) or one whose socket PyApex closed is dropped instead,
+		so the next acquire reconnects.
+		"""
+		if session not in self._all:
+			# close() ran while this session was in use: close it now, and free
+			# its slot for a waiting acquire
+			try:
+				session.ap.Close()
+			except Exception:
+				logger.exception("closing a released OSA session failed")
+			self._idle.put(None)
+			return
+		if not broken and _socket_alive(session.ap):
+			self._idle.put(session)
+			return
+		with self._guard:
+			if session in self._all:
+				self._all.remove(session)
+		if not hw_daemon.enabled():  # the daemon owns its connection
+			try:
+				session.ap.Close()
+			except Exception:
+				logger.exception("closing a dead OSA session failed")
+		self._idle.put(None)  # wake a waiting acquire so it reconnects
+		logger.info("dropped a dead OSA session")
+
+	def is_open(self) -> bool:
+		return bool(self._all)
+
+	def close(self):
+		"""Close idle sessions now and the ones in use when they are released"""
+		with self._guard:
+			self._all = []
+			idle = []
+			while True:
+				try:
+					session = self._idle.get_nowait()
+				except queue.Empty:
+					break
+				if session is not None:
+					idle.append(session)
+		for session in idle:
+			session.ap.Close()
+
+
+osa_pool = Ap2Pool(OSA_POOL_SIZE)
+_osa_local = threading.local()
+
+@contextlib.contextmanager
+def _osa_session():
+	"""Session for the current tool body: the one it already holds, or one from osa_pool"""
+	session = getattr(_osa_local, "session", None)
+	if session is not None:
+		yield session
+		return
+	session = _osa_local.session = osa_pool.acquire()
+	broken = False
+	try:
+		yield session
+	except OSError:  # ConnectionError and socket timeouts included
+		# a reset peer or a failed send leaves the socket open but unusable
+		broken = True
+		raise
+	except ApexError as e:
+		# argument checks raise it too, and leave the session usable
+		broken = e.ErrorCode not in (APXXXX_ERROR_ARGUMENT_TYPE, APXXXX_ERROR_ARGUMENT_VALUE)
+		raise
+	finally:
+		_osa_local.session = None
+		osa_pool.release(session, broken)
+
+def get_ap2xxx():
+	"""AP2XXX connection of the current tool's session (held by hw_daemon if OPTICS_HW_DAEMON=1)"""
+	with _osa_session() as session:
+		return session.ap
+
+def get_osa():
+	"""OSA sub-instrument of the current tool's session"""
+	with _osa_session() as session:
+		return session.osa
+
+def _close_osa():
+	_osa_state.clear()
+	_osa_settings.cache_clear()
+	_osa_unverified.clear()
+	osa_pool.close()
+
+# the daemon's connection is meant to outlive this process
+if not hw_daemon.enabled():
+	atexit.register(_close_osa)
+
+# single worker: pyplot is not thread safe, and plots must not hold up the tool reply
+_plot_pool = ThreadPoolExecutor(max_workers=1)
+
+def _plot_spectrum(x, y, path="../figures/OSA_plot.png"):
+	# matplotlib is imported on first use: it costs a few hundred ms at server start
+	import matplotlib
+	matplotlib.use("Agg")  # file output only, no GUI backend
+	from matplotlib import pyplot as plt
+
+	fig, ax = plt.subplots()
+	ax.grid(True)
+	ax.plot(x, y)
+	ax.set_xlabel("Wavelength (nm)")
+	ax.set_ylabel("Power (dBm)")
+	fig.savefig(path)
+	plt.close(fig)
+
+def _lttb(x, y, n: int):
+	"""
+	Largest-Triangle-Three-Buckets downsampling of (x, y) to n points. The
+	first and last points are kept; the points between are split into n - 2
+	buckets, and from each the one forming the largest triangle with the
+	point kept before it and the mean of the next bucket is taken.
+
+	Returns the indices of the kept points, so other arrays sampled on the
+	same axis can be indexed the same way.
+	"""
+	N = len(x)
+	if n >= N or n < 3:
+		return np.arange(N)
+	xf = x.astype(np.float64)
+	yf = y.astype(np.float64)
+	edges = np.linspace(1, N - 1, n - 1).astype(np.intp)  # bucket i is edges[i]:edges[i+1]
+	keep = np.empty(n, dtype=np.intp)
+	keep[0], keep[-1] = 0, N - 1
+	a = 0
+	for i in range(n - 2):
+		lo, hi = edges[i], edges[i + 1]
+		nxt = slice(hi, edges[i + 2] if i + 2 < n - 1 else N)
+		cx, cy = xf[nxt].mean(), yf[nxt].mean()
+		area = np.abs((xf[a] - cx) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (cy - yf[a]))
+		a = lo + int(np.argmax(area))
+		keep[i + 1] = a
+	return keep
+
+# setting one edge of the window moves the center and span, and vice versa
+_OSA_COUPLED = {
+	"start_nm": ("center_nm", "span_nm"),
+	"stop_nm": ("center_nm", "span_nm"),
+	"center_nm": ("start_nm", "stop_nm"),
+	"span_nm": ("start_nm", "stop_nm"),
+}
+
+def _osa_set_cached(field: str, value, setter: str, getter: str, cast=float):
+	"""
+	Call MyOSA.<setter>(value) and read back <getter>, unless `field` was last
+	set to the same value. Returns the applied value, or the requested one if
+	the set was queued on osa_batcher. Only call from an osa_tool body.
+	"""
+	cached = _osa_state.get(field)
+	if cached is not None and abs(cached[0] - value) < _OSA_TOL:
+		return cached[1]
+	for other in _OSA_COUPLED.get(field, ()):
+		_osa_state.pop(other, None)
+	_osa_state.pop(field, None)
+	_osa_settings.cache_clear()
+	if osa_batcher.enabled():
+		osa_batcher.set(field, setter, getter, value, cast)
+		_osa_local.note = f"queued; sent with the next OSA call or within {OSA_DEBOUNCE_MS:g} ms"
+		return value
+	MyOSA = get_osa()
+	getattr(MyOSA, setter)(value)
+	if not OSA_SET_READBACK:
+		_osa_state[field] = (value, value)
+		_osa_unverified[field] = (getter, cast)
+		_osa_local.note = "not read back yet; see osa_verify"
+		return value
+	applied = cast(getattr(MyOSA, getter)())
+	_osa_state[field] = (value, applied)
+	return applied
+
+def _osa_reconcile():
+	"""
+	Read back every setting written without verification, in one round trip,
+	into _osa_last_readback and _osa_state. Only call from an osa_tool body.
+	"""
+	items = list(_osa_unverified.items())
+	if not items:
+		return
+	for field, _ in items:
+		_osa_unverified.pop(field, None)
+	replies = _osa_query_multi([getter for _, (getter, _) in items])
+	for (field, (_, cast)), reply in zip(items, replies):
+		applied = cast(float(reply))
+		_osa_last_readback[field] = applied
+		if field in _osa_state:
+			_osa_state[field] = (_osa_state[field][0], applied)
+
+def _schedule_reconcile():
+	global _osa_reconcile_task
+	if _osa_reconcile_task is None or _osa_reconcile_task.done():
+		_osa_reconcile_task = asyncio.get_running_loop().create_task(_reconcile_later())
+
+def _reconcile_in_session():
+	with _osa_session():
+		osa_batcher.flush()
+		_osa_reconcile()
+
+async def _reconcile_later():
+	await asyncio.sleep(OSA_RECONCILE_S)
+	async with osa_lock:
+		try:
+			await asyncio.to_thread(_reconcile_in_session)
+		except Exception:
+			_osa_state.clear()
+			logger.exception("OSA settings read back failed")
+
+# Apex query mnemonics behind the OSA getters, so several can share one round trip
+_OSA_QUERIES = {
+	"GetCenter": "SPCTRWL?",
+	"GetStartWavelength": "SPSTRTWL?",
+	"GetStopWavelength": "SPSTOPWL?",
+	"GetSpan": "SPSPANWL?",
+	"GetNPoints": "SPNBPTSWP?",
+}
+
+# and behind the setters; the value follows the mnemonic directly, no reply
+_OSA_SETS = {
+	"SetCenter": "SPCTRWL",
+	"SetStartWavelength": "SPSTRTWL",
+	"SetStopWavelength": "SPSTOPWL",
+	"SetSpan": "SPSPANWL",
+	"SetNPoints": "SPNBPTSWP",
+}
+
+# argument name and accepted types each PyApex setter checks before sending
+_OSA_SET_ARGS = {
+	"SetCenter": ("Center", (float, int)),
+	"SetStartWavelength": ("Wavelength", (float, int)),
+	"SetStopWavelength": ("Wavelength", (float, int)),
+	"SetSpan": ("Span", (float, int)),
+	"SetNPoints": ("NPoints", int),
+}
+
+def _check_set(setter: str, value):
+	"""Make the argument checks of the PyApex setter, for a set that is queued instead"""
+	name, types = _OSA_SET_ARGS[setter]
+	if not isinstance(value, types):
+		raise ApexError(APXXXX_ERROR_ARGUMENT_TYPE, name)
+	if setter == "SetNPoints" and not AP2XXX_MINNPTS <= value <= AP2XXX_MAXNPTS:
+		raise ApexError(APXXXX_ERROR_ARGUMENT_VALUE, name)
+
+def _osa_wire():
+	"""Raw socket of the AP2XXX connection, or None when it lives in hw_daemon"""
+	ap = get_ap2xxx()
+	if isinstance(ap, hw_daemon.HwClient):
+		return None
+	return getattr(ap, "Connexion", None)
+
+def _osa_transact(conn, commands: list, n_replies: int) -> list:
+	"""
+	Send `commands` in one write and read back `n_replies` newline-terminated
+	replies as floats. On any error the socket is closed: replies may be
+	left unread in it, and a later query would read a stale one. Closing it
+	makes the pool drop the session.
+	"""
+	try:
+		Send(conn, "".join(c + "\n" for c in commands))
+		buf = ""
+		while buf.count("\n") < n_replies:
+			chunk = Receive(conn)
+			if not chunk:
+				raise ConnectionError("OSA closed the connection mid-reply")
+			buf += chunk
+		return [float(r) for r in buf.split("\n")[:n_replies]]
+	except Exception:
+		conn.close()
+		raise
+
+def _osa_query_multi(getters: list) -> list:
+	"""
+	Run several OSA getters with one TCP round trip: every query goes out in
+	one send and the newline-terminated replies are read back in order, as
+	floats.
+	Falls back to calling the getters one by one if there is no raw socket
+	(hardware daemon). Only call from an osa_tool body.
+	"""
+	conn = _osa_wire()
+	if conn is None:
+		osa = get_osa()
+		return [getattr(osa, g)() for g in getters]
+	return _osa_transact(conn, [_OSA_QUERIES[g] for g in getters], len(getters))
+
+class OsaWriteBatcher:
+	"""
+	Queue of OSA settings waiting to be sent. flush() writes every queued set
+	and the read-back query of each in one send, then records the applied
+	values in _osa_state, skipping fields that a later set in the batch moved.
+	Setting a field again before the flush replaces the queued value and
+	moves it to the end, so the instrument sees the last order. Only used with a raw socket (not through the hardware daemon).
+	"""
+
+	def __init__(self, debounce_ms: float):
+		self.debounce_s = debounce_ms / 1000.0
+		self.pending: Dict[str, tuple] = {}  # field -> (setter, getter, value, cast)
+		self._timer: Optional[asyncio.Task] = None
+		self._lock = threading.Lock()  # pooled sessions may queue and flush at once
+
+	def enabled(self) -> bool:
+		return self.debounce_s > 0 and not hw_daemon.enabled()
+
+	def set(self, field: str, setter: str, getter: str, value, cast=float):
+		_check_set(setter, value)  # fail in the tool that set it, not in the next flush
+		with self._lock:
+			self.pending.pop(field, None)
+			self.pending[field] = (setter, getter, value, cast)
+
+	def flush(self):
+		"""Send the queued settings. Only call from an osa_tool body."""
+		if not self.pending:
+			return
+		with self._lock:
+			items = list(self.pending.items())
+			self.pending.clear()
+		commands = [f"{_OSA_SETS[setter]}{value}" for _, (setter, _, value, _) in items]
+		# a field moved by a later set in the batch (start, then center) no longer
+		# holds its requested value, so it is not read back or recorded
+		kept = [(field, item) for i, (field, item) in enumerate(items)
+				if not any(field in _OSA_COUPLED.get(later, ()) for later, _ in items[i + 1:])]
+		commands += [_OSA_QUERIES[getter] for _, (_, getter, _, _) in kept]
+		replies = _osa_transact(_osa_wire(), commands, len(kept))
+		for (field, (_, _, value, cast)), reply in zip(kept, replies):
+			_osa_state[field] = (value, cast(float(reply)))
+
+	def schedule(self):
+		"""Flush after the debounce window unless a tool call flushes first"""
+		if self._timer is None or self._timer.done():
+			self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+	def _flush_in_session(self):
+		with _osa_session():
+			self.flush()
+
+	async def _flush_later(self):
+		await asyncio.sleep(self.debounce_s)
+		async with osa_lock:
+			try:
+				await asyncio.to_thread(self._flush_in_session)
+			except Exception:
+				_osa_state.clear()
+				logger.exception("Queued OSA settings failed")
+
+osa_batcher = OsaWriteBatcher(OSA_DEBOUNCE_MS)
+
+def _reading(field: str, value, unit: str, format: str, template: str):
+	"""Getter reply: a dict that FastMCP serializes as JSON, or `template` filled in for format "str"."""
+	if format == "str":
+		return template.format(value)
+	return {"field": field, "value": value, "unit": unit}
 
 # ============================================================================
 # APEX OSA Tools
@@ -32,40 +577,34 @@ def ghz_to_nm(f_ghz: float) -> float:
 """
 	Get Apex OSA power measurement.
 """
-@mcp.tool()
-async def get_osa_power_measurement() -> str:
+@osa_tool
+def get_osa_power_measurement(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""Get Apex OSA (optical spectrum analyzer) power measurement.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for "PowerValue: <value>\nUnit: <unit>".
+
+	Returns:
+	  {"field": "power", "value": <value>, "unit": <unit>}, or the text form
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	logging.info("connected")
+	MyAP2XXX = get_ap2xxx()
 
 	ApexMode = {'Powermeter':3,"OSA":4}
 	MyAP2XXX.ChangeMode(ApexMode['Powermeter'])
-	logging.info("change mode")
 
 	MyPowermeter = MyAP2XXX.Powermeter()
 	power = MyPowermeter.GetPower()
 	unit = MyPowermeter.GetUnit()
-
-	logging.info(power)
-	logging.info(unit)
-	
-	MyAP2XXX.Close()
+	logger.debug("power=%s unit=%s", power, unit)
 
 	if not power:
 		return "Unable to fetch OSA Power."
 
-	format_str = f"""
-		PowerValue: {power}
-		Unit: {unit}
-		"""
-	return "\n---\n".join(format_str)
+	return _reading("power", power, unit, format, "PowerValue: {}\nUnit: " + str(unit))
 
 
-@mcp.tool()
-async def get_osa_spectrum_measurement() -> dict:
+@osa_tool
+def get_osa_spectrum_measurement(osa, save_plot: bool = False, max_points: int = 4096) -> dict:
 	"""
 		Run a **single** OSA sweep using the **current** configuration and return the spectrum.
 
@@ -73,14 +612,27 @@ async def get_osa_spectrum_measurement() -> dict:
 		-------------------
 		- Connects to the OSA at `osa_ipaddress`.
 		- Triggers one acquisition (`Run()`).
-		- Retrieves the spectrum as **ASCII** arrays in **wavelength (nm)** and **power (dBm)**.
-		- Returns data in a simple table-like JSON structure:
+		- Retrieves the spectrum in **binary** as **wavelength (nm)** and **power (dBm)** arrays.
+		- Returns the arrays as base64-encoded little-endian float32 buffers:
 			{
 			  "columns": ["Wavelength (nm)", "Power (dBm)"],
-			  "rows":    [[x0, x1, ...], [y0, y1, ...]]
+			  "dtype": "float32",
+			  "n": <number of points returned>,
+			  "orig_n": <number of points in the sweep>,
+			  "downsampled": <true if n < orig_n>,
+			  "x_b64": "...",
+			  "y_b64": "...",
+			  "peak_nm": <wavelength of the highest point>,
+			  "peak_dbm": <its power>
 			}
-		  where `rows[0]` are X values (nm) and `rows[1]` are Y values (dBm).
-		- Closes the connection before returning.
+		  Decode with `np.frombuffer(base64.b64decode(x_b64), dtype="<f4")`.
+		  `x_ghz_b64` carries the same X axis in **frequency (GHz)** as float64 ("<f8").
+		- Sweeps longer than `max_points` (default 4096) are reduced to that many points
+		  with Largest-Triangle-Three-Buckets, which keeps peaks and edges.
+		  `max_points=0` returns every point. `peak_nm`/`peak_dbm` always come from the full sweep.
+		- If `save_plot` is true, also saves a plot to ../figures/OSA_plot.png in
+		  the background; the reply does not wait for it.
+		- Keeps the connection open for later calls (see `osa_close`).
 
 		Output units & ordering
 		-----------------------
@@ -89,42 +641,52 @@ async def get_osa_spectrum_measurement() -> dict:
 		- The underlying driver returns `[Y, X]`; this tool reorders to `[X, Y]` for clarity.
 
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-
-	Trace = MyOSA.Run()
+	Trace = osa.Run()
 
-	bASCII_data = True
+	bASCII_data = False
 	Data = [[], []]
 	if Trace > 0:
 		if bASCII_data == True:
-			Data = MyOSA.GetData("nm", "log", Trace)
+			Data = osa.GetData("nm", "log", Trace)
 		else:
-			Data = MyOSA.GetDataBin("nm", "log", Trace)
+			Data = osa.GetDataBin("nm", "log", Trace)
 
-	MyAP2XXX.Close()
+	x64 = np.asarray(Data[1], dtype="<f8")
+	x = x64.astype("<f4")
+	y = np.asarray(Data[0], dtype="<f4")
 
-	columns = ["Wavelength (nm)", "Power (dBm)"]
-	rows = [Data[1], Data[0]] if Trace > 0 else [[], []]
-
-	if Trace > 0:
-		plt.grid(True)
-		plt.plot(Data[1], Data[0])
-		plt.xlabel("Wavelength (nm)")
-		plt.ylabel("Power (dBm)")
-		# plt.show()
-		plt.savefig("../figures/OSA_plot.png")
-	else:
+	if Trace <= 0:
 		print("No spectrum acquired")
-
-	return {
-		"columns": columns,
-		"rows": rows
+	elif save_plot:
+		_plot_pool.submit(_plot_spectrum, x, y)
+
+	peak = None
+	if len(y):
+		i = int(np.argmax(y))
+		peak = (float(x[i]), float(y[i]))
+	orig_n = len(x)
+	if max_points and orig_n > max_points:
+		keep = _lttb(x, y, max_points)
+		x, y, x64 = x[keep], y[keep], x64[keep]
+
+	result = {
+		"columns": ["Wavelength (nm)", "Power (dBm)"],
+		"dtype": "float32",
+		"n": len(x),
+		"orig_n": orig_n,
+		"downsampled": len(x) < orig_n,
+		"x_b64": base64.b64encode(x.tobytes()).decode(),
+		"y_b64": base64.b64encode(y.tobytes()).decode(),
+		# from the float64 wavelengths: float32 (in nm or GHz) would round
+		# ~193 THz to the nearest 0.02 GHz
+		"x_ghz_b64": base64.b64encode((C_M_PER_S / x64).tobytes()).decode(),
 	}
+	if peak is not None:
+		result["peak_nm"], result["peak_dbm"] = peak
+	return result
 
-@mcp.tool()
-async def osa_set_units(x_unit: str = 'GHz', y_unit: str = 'lin') -> str:
+@osa_tool
+def osa_set_units(osa, x_unit: str = 'GHz', y_unit: str = 'lin') -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) output units. Does not start a sweep.
 
@@ -135,16 +697,12 @@ async def osa_set_units(x_unit: str = 'GHz', y_unit: str = 'lin') -> str:
 	Returns:
 	  "x_unit=<val>, y_unit=<val>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetScaleXUnit(x_unit)
-	MyOSA.SetScaleYUnit(y_unit)
-	MyAP2XXX.Close()
+	osa.SetScaleXUnit(x_unit)
+	osa.SetScaleYUnit(y_unit)
 	return f"Successfully set x-axis unit to {x_unit} and y-axis scale to {y_unit}."
 
-@mcp.tool()
-async def osa_set_start_wavelength(start_nm: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_start_wavelength(osa, start_nm: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum window START wavelength in nanometers. Does not start a sweep.
 
@@ -154,31 +712,25 @@ async def osa_set_start_wavelength(start_nm: float) -> str:
 	Returns:
 	  "Successfully set start wavelength to <val> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetStartWavelength(start_nm)
-	applied = float(MyOSA.GetStartWavelength())
-	MyAP2XXX.Close()
+	applied = _osa_set_cached("start_nm", start_nm, "SetStartWavelength", "GetStartWavelength")
 	return f"Successfully set start wavelength to {applied} nm"
 
-@mcp.tool()
-async def osa_get_start_wavelength() -> str:
+@osa_tool
+def osa_get_start_wavelength(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum window START wavelength in nanometers.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_window_start_wavelength=<value> nm"
+	  {"field": "start_nm", "value": <value>, "unit": "nm"}, or "spectrum_window_start_wavelength=<value> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetStartWavelength())
-	MyAP2XXX.Close()
-	return f"spectrum_window_start_wavelength={value} nm"
+	value = float(osa.GetStartWavelength())
+	return _reading("start_nm", value, "nm", format, "spectrum_window_start_wavelength={} nm")
 
-@mcp.tool()
-async def osa_set_stop_wavelength(stop_nm: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_stop_wavelength(osa, stop_nm: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum window STOP wavelength in nanometers. Does not start a sweep.
 
@@ -188,31 +740,25 @@ async def osa_set_stop_wavelength(stop_nm: float) -> str:
 	Returns:
 	  "Successfully set stop wavelength to <val> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetStopWavelength(stop_nm)
-	applied = float(MyOSA.GetStopWavelength())
-	MyAP2XXX.Close()
+	applied = _osa_set_cached("stop_nm", stop_nm, "SetStopWavelength", "GetStopWavelength")
 	return f"Successfully set stop wavelength to {applied} nm"
 
-@mcp.tool()
-async def osa_get_stop_wavelength() -> str:
+@osa_tool
+def osa_get_stop_wavelength(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum window STOP wavelength in nanometers.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_window_stop_wavelength=<value> nm"
+	  {"field": "stop_nm", "value": <value>, "unit": "nm"}, or "spectrum_window_stop_wavelength=<value> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetStopWavelength())
-	MyAP2XXX.Close()
-	return f"spectrum_window_stop_wavelength={value} nm"
+	value = float(osa.GetStopWavelength())
+	return _reading("stop_nm", value, "nm", format, "spectrum_window_stop_wavelength={} nm")
 
-@mcp.tool()
-async def osa_set_center(center_nm: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_center(osa, center_nm: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum CENTER wavelength in nanometers. Does not start a sweep.
 	The instrument will recompute start/stop edges around the current span.
@@ -223,31 +769,25 @@ async def osa_set_center(center_nm: float) -> str:
 	Returns:
 	  "Successfully set center wavelength to <val> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetCenter(center_nm)
-	applied = float(MyOSA.GetCenter())
-	MyAP2XXX.Close()
+	applied = _osa_set_cached("center_nm", center_nm, "SetCenter", "GetCenter")
 	return f"Successfully set center wavelength to {applied} nm"
 
-@mcp.tool()
-async def osa_get_center() -> str:
+@osa_tool
+def osa_get_center(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum CENTER wavelength in nanometers.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_center_wavelength=<value> nm"
+	  {"field": "center_nm", "value": <value>, "unit": "nm"}, or "spectrum_center_wavelength=<value> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetCenter())
-	MyAP2XXX.Close()
-	return f"spectrum_center_wavelength={value} nm"
+	value = float(osa.GetCenter())
+	return _reading("center_nm", value, "nm", format, "spectrum_center_wavelength={} nm")
 
-@mcp.tool()
-async def osa_set_span(span_nm: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_span(osa, span_nm: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum SPAN in nanometers. Does not start a sweep.
 	The instrument will recompute start/stop edges around the current center.
@@ -258,31 +798,25 @@ async def osa_set_span(span_nm: float) -> str:
 	Returns:
 	  "Successfully set span to <val> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetSpan(span_nm)
-	applied = float(MyOSA.GetSpan())
-	MyAP2XXX.Close()
+	applied = _osa_set_cached("span_nm", span_nm, "SetSpan", "GetSpan")
 	return f"Successfully set span to {applied} nm"
 
-@mcp.tool()
-async def osa_get_span() -> str:
+@osa_tool
+def osa_get_span(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum SPAN in nanometers.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_span=<value> nm"
+	  {"field": "span_nm", "value": <value>, "unit": "nm"}, or "spectrum_span=<value> nm"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetSpan())
-	MyAP2XXX.Close()
-	return f"spectrum_span={value} nm"
+	value = float(osa.GetSpan())
+	return _reading("span_nm", value, "nm", format, "spectrum_span={} nm")
 
-@mcp.tool()
-async def osa_get_settings() -> dict:
+@osa_tool
+def osa_get_settings(osa) -> dict:
 	"""
 		Get Apex OSA (Optical Spectrum Analyzer) key acquisition settings.
 
@@ -300,17 +834,19 @@ async def osa_get_settings() -> dict:
 			}
 
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
+	return dict(_osa_settings())
 
-	center_nm = float(MyOSA.GetCenter())
-	start_nm = float(MyOSA.GetStartWavelength())
-	stop_nm  = float(MyOSA.GetStopWavelength())
-	span_nm  = float(MyOSA.GetSpan())
-	npoints  = int(MyOSA.GetNPoints())
+# polled by dashboards; every setter path calls _osa_settings.cache_clear()
+@ttl_cache(0.5)
+def _osa_settings() -> dict:
+	center, start, stop, span, npts = _osa_query_multi(
+		["GetCenter", "GetStartWavelength", "GetStopWavelength", "GetSpan", "GetNPoints"])
 
-	MyAP2XXX.Close()
+	center_nm = float(center)
+	start_nm = float(start)
+	stop_nm  = float(stop)
+	span_nm  = float(span)
+	npoints  = int(float(npts))
 
 	return {
 		"start_nm": start_nm,
@@ -321,8 +857,8 @@ async def osa_get_settings() -> dict:
 	}
 
 
-@mcp.tool()
-async def osa_set_x_resolution(resolution: float) -> str:
+@osa_tool
+def osa_set_x_resolution(osa, resolution: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) X-axis measurement resolution.
 	Resolution is expressed in the current X unit (as set by SetScaleXUnit). Does not start a sweep.
@@ -333,34 +869,29 @@ async def osa_set_x_resolution(resolution: float) -> str:
 	Returns:
 	  "Successfully set x_resolution to <val>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetXResolution(resolution)
-	applied = float(MyOSA.GetXResolution())
-	MyAP2XXX.Close()
+	osa.SetXResolution(resolution)
+	applied = float(osa.GetXResolution())
 	return f"Successfully set x_resolution to {applied}"
 
 
-@mcp.tool()
-async def osa_get_x_resolution() -> str:
+@osa_tool
+def osa_get_x_resolution(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) X-axis measurement resolution.
 	Resolution is expressed in the current X unit (as set by SetScaleXUnit).
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "x_resolution=<value>"
+	  {"field": "x_resolution", "value": <value>, "unit": "x unit"}, or "x_resolution=<value>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetXResolution())
-	MyAP2XXX.Close()
-	return f"x_resolution={value}"
+	value = float(osa.GetXResolution())
+	return _reading("x_resolution", value, "x unit", format, "x_resolution={}")
 
 
-@mcp.tool()
-async def osa_set_y_resolution(resolution: float) -> str:
+@osa_tool
+def osa_set_y_resolution(osa, resolution: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) Y-axis resolution (power per division).
 	Resolution is expressed in the current Y unit (as set by SetScaleYUnit). Does not start a sweep.
@@ -371,34 +902,29 @@ async def osa_set_y_resolution(resolution: float) -> str:
 	Returns:
 	  "Successfully set y_resolution to <val>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetYResolution(resolution)
-	applied = float(MyOSA.GetYResolution())
-	MyAP2XXX.Close()
+	osa.SetYResolution(resolution)
+	applied = float(osa.GetYResolution())
 	return f"Successfully set y_resolution to {applied}"
 
 
-@mcp.tool()
-async def osa_get_y_resolution() -> str:
+@osa_tool
+def osa_get_y_resolution(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) Y-axis resolution (power per division).
 	Resolution is expressed in the current Y unit (as set by SetScaleYUnit).
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "y_resolution=<value>"
+	  {"field": "y_resolution", "value": <value>, "unit": "y unit"}, or "y_resolution=<value>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = float(MyOSA.GetYResolution())
-	MyAP2XXX.Close()
-	return f"y_resolution={value}"
+	value = float(osa.GetYResolution())
+	return _reading("y_resolution", value, "y unit", format, "y_resolution={}")
 
 
-@mcp.tool()
-async def osa_set_npoints(npoints: int) -> str:
+@osa_tool(deferred=True)
+def osa_set_npoints(osa, npoints: int) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) number of points for measurement.
 	Does not start a sweep.
@@ -409,32 +935,26 @@ async def osa_set_npoints(npoints: int) -> str:
 	Returns:
 	  "Successfully set npoints to <val>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetNPoints(npoints)
-	applied = int(MyOSA.GetNPoints())
-	MyAP2XXX.Close()
+	applied = _osa_set_cached("npoints", npoints, "SetNPoints", "GetNPoints", cast=int)
 	return f"Successfully set npoints to {applied}"
 
 
-@mcp.tool()
-async def osa_get_npoints() -> str:
+@osa_tool
+def osa_get_npoints(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) number of points configured for measurement.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "npoints=<value>"
+	  {"field": "npoints", "value": <value>, "unit": "points"}, or "npoints=<value>"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value = int(MyOSA.GetNPoints())
-	MyAP2XXX.Close()
-	return f"npoints={value}"
+	value = int(osa.GetNPoints())
+	return _reading("npoints", value, "points", format, "npoints={}")
 
-@mcp.tool()
-async def osa_set_start_freq_ghz(start_ghz: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_start_freq_ghz(osa, start_ghz: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum window START frequency in gigahertz. Does not start a sweep.
 
@@ -444,31 +964,25 @@ async def osa_set_start_freq_ghz(start_ghz: float) -> str:
 	Returns:
 	  "Successfully set start frequency to <val> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetStartWavelength(ghz_to_nm(start_ghz))
-	applied_nm = float(MyOSA.GetStartWavelength())
-	MyAP2XXX.Close()
+	applied_nm = _osa_set_cached("start_nm", ghz_to_nm(start_ghz), "SetStartWavelength", "GetStartWavelength")
 	return f"Successfully set start frequency to {nm_to_ghz(applied_nm):.3f} GHz"
 
-@mcp.tool()
-async def osa_get_start_freq_ghz() -> str:
+@osa_tool
+def osa_get_start_freq_ghz(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum window START frequency in gigahertz.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_window_start_frequency=<value> GHz"
+	  {"field": "start_freq_ghz", "value": <value>, "unit": "GHz"}, or "spectrum_window_start_frequency=<value> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value_nm = float(MyOSA.GetStartWavelength())
-	MyAP2XXX.Close()
-	return f"spectrum_window_start_frequency={nm_to_ghz(value_nm):.3f} GHz"
+	value_nm = float(osa.GetStartWavelength())
+	return _reading("start_freq_ghz", nm_to_ghz(value_nm), "GHz", format, "spectrum_window_start_frequency={:.3f} GHz")
 
-@mcp.tool()
-async def osa_set_stop_freq_ghz(stop_ghz: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_stop_freq_ghz(osa, stop_ghz: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum window STOP frequency in gigahertz. Does not start a sweep.
 
@@ -478,31 +992,25 @@ async def osa_set_stop_freq_ghz(stop_ghz: float) -> str:
 	Returns:
 	  "Successfully set stop frequency to <val> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetStopWavelength(ghz_to_nm(stop_ghz))
-	applied_nm = float(MyOSA.GetStopWavelength())
-	MyAP2XXX.Close()
+	applied_nm = _osa_set_cached("stop_nm", ghz_to_nm(stop_ghz), "SetStopWavelength", "GetStopWavelength")
 	return f"Successfully set stop frequency to {nm_to_ghz(applied_nm):.3f} GHz"
 
-@mcp.tool()
-async def osa_get_stop_freq_ghz() -> str:
+@osa_tool
+def osa_get_stop_freq_ghz(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum window STOP frequency in gigahertz.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_window_stop_frequency=<value> GHz"
+	  {"field": "stop_freq_ghz", "value": <value>, "unit": "GHz"}, or "spectrum_window_stop_frequency=<value> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value_nm = float(MyOSA.GetStopWavelength())
-	MyAP2XXX.Close()
-	return f"spectrum_window_stop_frequency={nm_to_ghz(value_nm):.3f} GHz"
+	value_nm = float(osa.GetStopWavelength())
+	return _reading("stop_freq_ghz", nm_to_ghz(value_nm), "GHz", format, "spectrum_window_stop_frequency={:.3f} GHz")
 
-@mcp.tool()
-async def osa_set_center_freq_ghz(center_ghz: float) -> str:
+@osa_tool(deferred=True)
+def osa_set_center_freq_ghz(osa, center_ghz: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum CENTER frequency in gigahertz. Does not start a sweep.
 	The instrument will recompute start/stop edges around the current span.
@@ -513,31 +1021,25 @@ async def osa_set_center_freq_ghz(center_ghz: float) -> str:
 	Returns:
 	  "Successfully set center frequency to <val> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	MyOSA.SetCenter(ghz_to_nm(center_ghz))
-	applied_nm = float(MyOSA.GetCenter())
-	MyAP2XXX.Close()
+	applied_nm = _osa_set_cached("center_nm", ghz_to_nm(center_ghz), "SetCenter", "GetCenter")
 	return f"Successfully set center frequency to {nm_to_ghz(applied_nm):.3f} GHz"
 
-@mcp.tool()
-async def osa_get_center_freq_ghz() -> str:
+@osa_tool
+def osa_get_center_freq_ghz(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum CENTER frequency in gigahertz.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
 	Returns:
-	  "spectrum_center_frequency=<value> GHz"
+	  {"field": "center_freq_ghz", "value": <value>, "unit": "GHz"}, or "spectrum_center_frequency=<value> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	value_nm = float(MyOSA.GetCenter())
-	MyAP2XXX.Close()
-	return f"spectrum_center_frequency={nm_to_ghz(value_nm):.3f} GHz"
+	value_nm = float(osa.GetCenter())
+	return _reading("center_freq_ghz", nm_to_ghz(value_nm), "GHz", format, "spectrum_center_frequency={:.3f} GHz")
 
-@mcp.tool()
-async def osa_set_span_freq_ghz(span_ghz: float) -> str:
+@osa_tool
+def osa_set_span_freq_ghz(osa, span_ghz: float) -> str:
 	"""
 	Set the OSA (optical spectrum analyzer) spectrum SPAN in gigahertz. Does not start a sweep.
 	The instrument will recompute start/stop edges around the current center.
@@ -548,39 +1050,100 @@ async def osa_set_span_freq_ghz(span_ghz: float) -> str:
 	Returns:
 	  "Successfully set span to <val> GHz"
 	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-
-	center_nm = float(MyOSA.GetCenter())
+	center_nm = float(osa.GetCenter())
 	center_ghz = nm_to_ghz(center_nm)
 	f_start = center_ghz - span_ghz / 2.0
 	f_stop  = center_ghz + span_ghz / 2.0
 
-	MyOSA.SetStartWavelength(ghz_to_nm(f_start))
-	MyOSA.SetStopWavelength(ghz_to_nm(f_stop))
-
-	applied_start_ghz = nm_to_ghz(float(MyOSA.GetStartWavelength()))
-	applied_stop_ghz  = nm_to_ghz(float(MyOSA.GetStopWavelength()))
+	for field in ("start_nm", "stop_nm", "center_nm", "span_nm"):
+		_osa_state.pop(field, None)
+	_osa_settings.cache_clear()
+	osa.SetStartWavelength(ghz_to_nm(f_start))
+	osa.SetStopWavelength(ghz_to_nm(f_stop))
+
+	start, stop = _osa_query_multi(["GetStartWavelength", "GetStopWavelength"])
+	_osa_state["start_nm"] = (ghz_to_nm(f_start), float(start))
+	_osa_state["stop_nm"] = (ghz_to_nm(f_stop), float(stop))
+	applied_start_ghz = nm_to_ghz(float(start))
+	applied_stop_ghz  = nm_to_ghz(float(stop))
 	applied_span = abs(applied_stop_ghz - applied_start_ghz)
-	MyAP2XXX.Close()
 	return f"Successfully set span to {applied_span:.3f} GHz"
 
-@mcp.tool()
-async def osa_get_span_freq_ghz() -> str:
+@osa_tool
+def osa_get_span_freq_ghz(osa, format: Literal["json", "str"] = "json") -> Union[dict, str]:
 	"""
 	Get the OSA (optical spectrum analyzer) spectrum SPAN in gigahertz.
 
+	Args:
+	  format: "json" (default) for a field/value/unit dict, "str" for the legacy text.
+
+	Returns:
+	  {"field": "span_freq_ghz", "value": <value>, "unit": "GHz"}, or "spectrum_span=<value> GHz"
+	"""
+	start, stop = _osa_query_multi(["GetStartWavelength", "GetStopWavelength"])
+	f_start = nm_to_ghz(float(start))
+	f_stop  = nm_to_ghz(float(stop))
+	return _reading("span_freq_ghz", abs(f_stop - f_start), "GHz", format, "spectrum_span={:.3f} GHz")
+
+# getter and type behind each field the setters remember
+_OSA_FIELDS = {
+	"start_nm": ("GetStartWavelength", float),
+	"stop_nm": ("GetStopWavelength", float),
+	"center_nm": ("GetCenter", float),
+	"span_nm": ("GetSpan", float),
+	"npoints": ("GetNPoints", int),
+}
+
+@osa_tool
+def osa_verify(osa) -> str:
+	"""
+	Read back the OSA (optical spectrum analyzer) settings made through the set tools and
+	compare them with the requested values, in one round trip. Use when the set tools
+	reported a value as not read back yet and confirmation is needed.
+
+	Returns:
+	  One "<field>: requested <val>, applied <val>" line per setting.
+	"""
+	for field in _osa_state:
+		if field in _OSA_FIELDS:
+			_osa_unverified[field] = _OSA_FIELDS[field]
+	_osa_reconcile()
+	if not _osa_state:
+		return "No OSA settings to verify"
+	return "\n".join(f"{field}: requested {requested}, applied {applied}"
+					 for field, (requested, applied) in _osa_state.items())
+
+@osa_tool(hold_session=False)
+def osa_cache_clear() -> str:
+	"""
+	Forget the OSA (optical spectrum analyzer) settings remembered from earlier set calls,
+	so the next set of each value is sent to the instrument again. Use after the OSA was
+	changed from its front panel or by another program.
+
 	Returns:
-	  "spectrum_span=<value> GHz"
-	"""
-	ipAddress = osa_ipaddress
-	MyAP2XXX = AP2XXX(ipAddress, Simulation=False)
-	MyOSA = MyAP2XXX.OSA()
-	f_start = nm_to_ghz(float(MyOSA.GetStartWavelength()))
-	f_stop  = nm_to_ghz(float(MyOSA.GetStopWavelength()))
-	MyAP2XXX.Close()
-	return f"spectrum_span={abs(f_stop - f_start):.3f} GHz"
+	  Status message.
+	"""
+	n = len(_osa_state)
+	_osa_state.clear()
+	_osa_settings.cache_clear()
+	return f"Cleared {n} cached OSA settings"
+
+@osa_tool(hold_session=False)
+def osa_close() -> str:
+	"""
+	Close the connection to the Apex OSA. It reopens automatically on the next OSA tool call.
+
+	Returns:
+	  Status message.
+	"""
+	try:
+		if osa_pool.is_open():
+			_close_osa()
+			return "Successfully closed OSA connection"
+		else:
+			return "OSA connection already closed"
+	except Exception as e:
+		return f"Error closing OSA connection: {str(e)}"
 
 ######################## main ########################
 if __name__ == "__main__":
@@ -1,29 +1,33 @@
 from typing import Any, Optional, Dict, Union, Literal
-import logging, sys, re, asyncio, os, subprocess
+import logging, sys, re, asyncio, os, subprocess, contextlib
 from mcp.server.fastmcp import FastMCP
-from matplotlib import pyplot as plt
 from pathlib import Path
 import pandas as pd
-from POD2000 import POD2000
+from pod_tools import register_pod_tools, get_pod, pod_lock
 from arduino_ctrl import ArduinoController
-from control_single_beam_module import run_control_single_beam
+from control_single_beam_module import run_control_single_beam, target_stokes, warm_kernels
 
 logger = logging.getLogger(__name__)
 
-pod_instance = None
 arduino_instance = None
 
-# Initialize FastMCP server
-mcp = FastMCP("opticsMCP")
+async def _warm_kernels():
+    try:
+        await asyncio.to_thread(warm_kernels)
+    except Exception:
+        logger.exception("Kernel warm-up failed; they compile on the first stabilization instead")
 
+@contextlib.asynccontextmanager
+async def lifespan(server):
+    task = asyncio.create_task(_warm_kernels())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+# Initialize FastMCP server
+mcp = FastMCP("opticsMCP", lifespan=lifespan)
 
-def get_pod():
-    """Get or create POD2000 instance"""
-    global pod_instance
-    if pod_instance is None:
-        pod_instance = POD2000()
-        pod_instance.open()
-    return pod_instance
 
 def get_arduino():
     """Get or create Arduino controller instance"""
@@ -32,160 +36,8 @@ def get_arduino():
         arduino_instance = ArduinoController(port="COM5", baudrate=115200)
     return arduino_instance
 
-# ============================================================================
-# Luna POD2000 Polarimeter Tools
-# ============================================================================
-@mcp.tool()
-async def pod_get_idn() -> str:
-    """
-    Get the POD2000 polarimeter identification string containing manufacturer, model, serial number, and firmware version.
-    
-    Returns:
-      Device identification string in standard SCPI *IDN? format
-    """
-    try:
-        pod = get_pod()
-        idn = pod.idn()
-        return f"POD2000 ID: {idn}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_configure(
-    wavelength_nm: float = 1060.0,
-    gain: str = "AUTO",
-    transfer: str = "MANUAL",
-    power_unit: str = "UW"
-) -> str:
-    """
-    Configure the POD2000 polarimeter measurement settings including wavelength, gain, transfer mode, and power unit.
-    
-    Args:
-      wavelength_nm: Operating wavelength in nanometers (valid range: 1030-1090 nm). Must match the laser wavelength for accurate measurements.
-      gain: Detector gain setting - GAIN1 (lowest) through GAIN5 (highest), UP/DOWN for incremental adjust, AUTO for automatic gain control, or OPTIMIZE for one-time optimization
-      transfer: Data transfer mode - MANUAL (single measurement on command) or CONTINUOUS (continuous streaming)
-      power_unit: Power measurement unit - UW (microwatts) or NW (nanowatts)
-    
-    Returns:
-      Confirmation message with all applied settings and verified wavelength
-    """
-    try:
-        pod = get_pod()
-        pod.configure(wavelength_nm=wavelength_nm, gain=gain, transfer=transfer, power_unit=power_unit)
-        wl_check = pod.get_wavelength()
-        return f"POD2000 configured: {wavelength_nm} nm, gain={gain}, transfer={transfer}, unit={power_unit} (verified: {wl_check} nm)"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_read_polarization() -> str:
-    """
-    Read the complete polarization state from POD2000 including degree of polarization, azimuth angle, and ellipticity angle.
-    
-    The measurement returns:
-    - DOP (Degree of Polarization): 0.0 (unpolarized) to 1.0 (fully polarized)
-    - Azimuth (psi): Orientation angle of polarization ellipse major axis, range -90 deg to +90 deg
-    - Ellipticity (chi): Shape of polarization ellipse, range -45 deg (left circular) to +45 deg (right circular), 0 deg = linear
-    
-    Returns:
-      Formatted string with DOP, azimuth angle in degrees, and ellipticity angle in degrees
-    """
-    try:
-        pod = get_pod()
-        dop, psi_deg, chi_deg = pod.read_pol()
-        return f"DOP: {dop:.4f}, Azimuth: {psi_deg:.2f} deg, Ellipticity: {chi_deg:.2f} deg"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_read_power() -> str:
-    """
-    Read the optical power measurement from POD2000 in the currently configured unit (microwatts or nanowatts).
-    
-    Power reading depends on:
-    - Current gain setting (affects sensitivity and range)
-    - Configured power unit (UW or NW)
-    - Wavelength calibration setting
-    
-    Returns:
-      Power value in the unit configured in the device (use pod_configure to set unit)
-    """
-    try:
-        pod = get_pod()
-        power = pod.read_power()
-        return f"Power: {power:.3f}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_read_stokes() -> str:
-    """
-    Read raw Stokes parameters (S0, S1, S2, S3) and power from POD2000.
-    
-    Stokes parameters represent the complete polarization state:
-    - S0: Total intensity (always positive)
-    - S1: Horizontal vs vertical linear polarization (+ = horizontal, - = vertical)
-    - S2: +45 deg vs -45 deg linear polarization (+ = +45 deg, - = -45 deg)
-    - S3: Right vs left circular polarization (+ = right circular, - = left circular)
-    - Power: Same as pod_read_power(), in configured units
-    
-    The normalized Stokes vector (S1/S0, S2/S0, S3/S0) defines a point on the Poincaré sphere.
-    DOP = sqrt(S1² + S2² + S3²) / S0
-    
-    Returns:
-      All five raw measurement values (S0, S1, S2, S3, Power)
-    """
-    try:
-        pod = get_pod()
-        S0, S1, S2, S3, power = pod.read_raw5()
-        return f"S0: {S0:.4f}, S1: {S1:.4f}, S2: {S2:.4f}, S3: {S3:.4f}, Power: {power:.3f}"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_set_wavelength(wavelength_nm: float) -> str:
-    """
-    Set only the POD2000 operating wavelength without changing other configuration settings.
-    
-    This is a quick configuration command that updates wavelength while preserving current gain, transfer mode, and power unit settings.
-    The wavelength must match your laser source for accurate polarization measurements due to wavelength-dependent detector response.
-    
-    Args:
-      wavelength_nm: Operating wavelength in nanometers (valid range: 1030-1090 nm)
-    
-    Returns:
-      Confirmation message with the verified wavelength setting from the device
-    """
-    try:
-        pod = get_pod()
-        pod.scpi(f":CONF:WAVElength {wavelength_nm:.4f}", expect_reply=False)
-        wl_check = pod.get_wavelength()
-        return f"Wavelength set to {wl_check} nm"
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-@mcp.tool()
-async def pod_close() -> str:
-    """
-    Close the USB connection to the POD2000 polarimeter and release system resources.
-    
-    This should be called when finished with measurements or before reconnecting to the device.
-    The connection will automatically reopen on the next measurement command if needed.
-    
-    Returns:
-      Confirmation message indicating connection status
-    """
-    global pod_instance
-    try:
-        if pod_instance is not None:
-            pod_instance.close()
-            pod_instance = None
-            return "Successfully closed POD2000 connection"
-        else:
-            return "POD2000 connection already closed"
-    except Exception as e:
-        import traceback
-        return f"Error closing POD2000: {str(e)}\n{traceback.format_exc()}"
+# Luna POD2000 polarimeter tools (pod_tools.py)
+register_pod_tools(mcp)
 
 # ============================================================================
 # Piezo Control Tools
@@ -319,9 +171,15 @@ async def polarization_stabilize(
     stop_threshold_deg: float = 0.5,
     max_rounds: int = 400,
     settle_time_sec: float = 0.01,
+    settle_time_per_step_sec: Optional[list[float]] = None,
     init_code: int = 2048,
     log_filepath: str = "./polarization_control_mcp_2.csv",
-    reset_log: bool = True
+    reset_log: bool = True,
+    log_verbose: bool = False,
+    method: str = "coordinate",
+    calibrate_settle: bool = False,
+    metric: str = "angles",
+    greedy_accept: bool = True
 ) -> dict:
     """
     Run single-beam polarization stabilization using piezo feedback control.
@@ -333,7 +191,8 @@ async def polarization_stabilize(
     For each round, tests +/- steps on each of 4 channels, moves to better position
     if improvement found, automatically reduces step size as error decreases.
     
-    All measurement data is saved to CSV for later plotting/analysis.
+    The accepted steps of each round are saved to CSV for later plotting/analysis
+    (every probe as well with log_verbose=True).
     
     Args:
       target_azimuth_deg: Target azimuth angle psi in degrees, range [-90, +90]
@@ -342,9 +201,25 @@ async def polarization_stabilize(
       stop_threshold_deg: Convergence threshold (angular error in degrees). Default 0.5 deg
       max_rounds: Maximum optimization rounds. Default 400
       settle_time_sec: Piezo settling time after voltage change. Default 0.01s
+      settle_time_per_step_sec: Optional settling time per step size, one value for each
+        of the 6 step sizes (256, 128, 64, 32, 8, 2 codes), e.g.
+        [0.020, 0.015, 0.010, 0.005, 0.002, 0.001]. Replaces settle_time_sec. Default None
       init_code: Initial DAC code for all channels (0-4095). Default 2048
       log_filepath: CSV file path to log all measurements. Default "./polarization_control_mcp.csv"
       reset_log: If True, delete existing log file before starting. Default True
+      log_verbose: If True, log every probe and trial step; otherwise only the accepted
+        steps and the end-of-round reading of each round. Default False
+      method: "coordinate" tests +/- steps channel by channel; "gradient" probes +step
+        on each channel once and moves all 4 together along the estimated gradient
+        (fewer piezo writes and reads per round). Default "coordinate"
+      calibrate_settle: If True, measure the settle time of each step size before
+        starting and use it (capped at settle_time_sec) instead of settle_time_sec. Default False
+      metric: "angles" measures error as the wrapped (azimuth, ellipticity) difference;
+        "sphere" as half the angle between the two states on the Poincare sphere, which
+        stays well-behaved near circular polarization. Default "angles"
+      greedy_accept: With method="coordinate", end a round as soon as an accepted channel
+        brings the error under half the current stage's threshold, skipping the remaining
+        channels' probes. Default True
     
     Returns:
       dict: {
@@ -372,28 +247,39 @@ async def polarization_stabilize(
     """
     try:
         arduino = get_arduino()
-        pod = get_pod()
         
-        # Configure POD with specified wavelength
-        pod.configure(wavelength_nm=wavelength_nm, gain="AUTO", transfer="MANUAL", power_unit="UW")
+        def stabilize():
+            pod = get_pod()
+            # Configure POD with specified wavelength
+            pod.configure(wavelength_nm=wavelength_nm, gain="AUTO", transfer="MANUAL", power_unit="UW")
+            # Run control algorithm
+            return run_control_single_beam(
+                arduino,
+                pod,
+                (target_azimuth_deg, target_ellipticity_deg),
+                steps_codes=(256, 128, 64, 32, 8, 2),
+                thresh=(40.0, 25.0, 15.0, 5.0, 2.0, 0.5),
+                stop_threshold=stop_threshold_deg,
+                settle_s=settle_time_sec,
+                settle_s_per_step=settle_time_per_step_sec,
+                init_code=init_code,
+                min_code=0,
+                max_code=4095,
+                max_rounds=max_rounds,
+                log_path=log_filepath,
+                reset_log=reset_log,
+                log_verbose=log_verbose,
+                method=method,
+                calibrate_settle=calibrate_settle,
+                metric=metric,
+                greedy_accept=greedy_accept,
+                target_vec=target_stokes(target_azimuth_deg, target_ellipticity_deg) if metric == "sphere" else None,
+            )
         
-        # Run control algorithm
-        result = await asyncio.to_thread(
-            run_control_single_beam,
-            arduino,
-            pod,
-            (target_azimuth_deg, target_ellipticity_deg),
-            steps_codes=(256, 128, 64, 32, 8, 2),
-            thresh=(40.0, 25.0, 15.0, 5.0, 2.0, 0.5),
-            stop_threshold=stop_threshold_deg,
-            settle_s=settle_time_sec,
-            init_code=init_code,
-            min_code=0,
-            max_code=4095,
-            max_rounds=max_rounds,
-            log_path=log_filepath,
-            reset_log=reset_log,
-        )
+        # the whole run holds the POD2000 like any other pod_* tool, so no
+        # read or pod_close can interleave with it on the USB connection
+        async with pod_lock:
+            result = await asyncio.to_thread(stabilize)
         
         # Format return value
         converged = result["converged"]